@@ -40,13 +40,20 @@ from novaclient import exceptions
 
 from config import user, password, auth_url 
 from config import instance_name, key_name, private_key_file, pub_key, key_name
-from config import image_name, flavor_name, sec_group_name, vm_user_name, wait_before_ssh
+from config import image_name, flavor_name, sec_group_name, vm_user_name
 from config import tenant_name, region_name 
 
-from keystoneclient.v2_0 import client as ksclient
-import re
 from prettytable import PrettyTable
+from parallel import run_parallel, print_results
+import ovs
+import tracing
+import placement
+import hostmap
+import remote
+import cloud
 from topology import topology, nodes
+from graph import Graph
+from manifest import Manifest
 
 
 def print_msg(msg):
@@ -54,40 +61,17 @@ def print_msg(msg):
     print msg
 
 """
-Here we parse the 'topology' dictionary found inside topology.py and extract 
-a list 'nodeList' which stores the names of every Node
+Here we parse the 'topology' dictionary found inside topology.py into a graph of
+its nodes and links, and extract a list 'nodeList' which stores the names of every Node
 """
-# parse the user topology
-valuelist = []
-for values in topology.values():
-    for tuples in values:
-        # we only want the hosts 
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in valuelist):
-                valuelist.append(tuples[0])
-
-numHosts = len(valuelist)
-numSwitches = len(topology.keys())
-numNodes = numHosts + numSwitches
-
-# this list contains the switch names and host names
-nodeList = []
-# start off by appending the switche names
-for key in topology.keys():
-    if (key not in nodeList):
-        nodeList.append(key)
-
-# this list only holds the host names (used to append into the nodeList)
-hostList = []
-for values in topology.values():
-    for tuples in values:
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in hostList):
-                hostList.append(tuples[0])
-
-hostList.sort()
-for elem in hostList:
-    nodeList.append(elem)
+# parse the user topology into its nodes and links
+graph = Graph(topology)
+hostList = graph.hosts
+nodeList = graph.node_list()
+
+numHosts = len(hostList)
+numSwitches = len(graph.switches)
+numNodes = len(nodeList)
 
 
 try:
@@ -97,238 +81,130 @@ except:
     print "cant open key file: %s" %private_key_file
     sys.exit(0)
 
-
-# three functions needed for whale client connection
-def _strip_version(endpoint):
-        """Strip a version from the last component of an endpoint if present"""
-
-        # Get rid of trailing '/' if present
-        if endpoint.endswith('/'):
-            endpoint = endpoint[:-1]
-        url_bits = endpoint.split('/')
-        # regex to match 'v1' or 'v2.0' etc
-        if re.match('v\d+\.?\d*', url_bits[-1]):
-            endpoint = '/'.join(url_bits[:-1])
-        return endpoint
-
-
-def _get_ksclient(**kwargs):
-        """Get an endpoint and auth token from Keystone.
-
-        :param username: name of user
-        :param password: user's password
-        :param tenant_id: unique identifier of tenant
-        :param tenant_name: name of tenant
-        :param auth_url: endpoint to authenticate against
-        """
-        return ksclient.Client(username=kwargs.get('username'),
-                               password=kwargs.get('password'),
-                               tenant_id=kwargs.get('tenant_id'),
-                               tenant_name=kwargs.get('tenant_name'),
-                               auth_url=kwargs.get('auth_url'),
-                               insecure=kwargs.get('insecure'))
-
-def _get_endpoint(client, **kwargs):
-        """Get an endpoint using the provided keystone client."""
-
-        service_type = kwargs.get('service_type') or 'configuration'
-        endpoint_type = kwargs.get('endpoint_type') or 'publicURL'
-        region = kwargs.get('region')
-        if region is not None:
-                endpoint = client.service_catalog.url_for(
-                             attr='region',
-                             filter_value=region, 
-                             service_type=service_type,
-                             endpoint_type=endpoint_type)
-        else:
-                endpoint = client.service_catalog.url_for(
-                             service_type=service_type,
-                             endpoint_type=endpoint_type)
-
-        return _strip_version(endpoint)
+# one ssh session per node, shared by the sanity test and the ovs commands
+sessions = remote.SessionPool(private_key_file)
+
+# nova and quantum clients of every region, sharing one keystone token
+clients = cloud.ClientFactory(user, password, tenant_name, auth_url)
+# the servers of every region by name, listed once per region
+server_index = cloud.ServerIndex(clients, instance_name)
+# what the earlier scripts recorded about the deployment, see manifest.py
+manifest = Manifest()
+manifest.load()
+# entries of VMs deleted or failed since are looked up in the cloud again
+for node in manifest.revalidate(server_index):
+    print "VM of %s recorded in %s is gone or failed, looking it up again" % (node, manifest.path)
+
+# the regions the nodes were launched in, when 'region_assignment' is set in config.py
+placement.assign_regions(graph, nodes, region_name, clients, manifest)
+# where the hosts are attached, written for the controllers, see hostmap.py
+host_map = hostmap.HostMap()
+host_map.load()
+# with --refresh only the nodes whose configuration changed since the last map are read
+refresh = '--refresh' in sys.argv[1:]
 
 
 def check_host(server, host):
-        server.get()
+        # a server from the status polling already has its host
+        if not hasattr(server, "OS-EXT-SRV-ATTR:host"):
+            server.get()
         if hasattr(server, "OS-EXT-SRV-ATTR:host"):
                 return getattr(server, "OS-EXT-SRV-ATTR:host") == host
         return False
 
 def checkServer(server):
-        server.get()
+        # a server from the status polling already has its fault, if any
+        if not hasattr(server, "status"):
+            server.get()
         if hasattr(server, "fault"):
             print_msg("error fault is " + str(getattr(server, "fault")) + "\n")
 
-def _calc_vni(node):
-    vn1 = 0
-    if node.lower().startswith('sw'):
-       vn1=node.lower()
-       vn1=int(vn1[2:]) + 500
-    elif node.lower().startswith('h'):
-       vn1=node.lower()
-       vn1=int(vn1[1:])
-    return vn1
-
-
-num_links={}
-
-def _get_vni(node1, node2):
-    vn1=_calc_vni(node1)
-    vn2=_calc_vni(node2)
-    d1=num_links.setdefault(node1, {})
-    d2=d1.setdefault(node2, 0)
-    num_links[node1][node2] += 1
-    if vn1 < vn2:
-        vn = vn1 * 16384 + vn2 * 16 + d2
-    else:
-        vn = vn2 * 16384 + vn1 * 16 + d2
-    print "%s --> %s : %s" %(node1, node2, vn)
-    return vn
-
-ports={}
 u_dict={}
 
 """
-This function takes in a switch name, in the format 'sw#', ex: 'sw1' and runs several
-ovs-vsctl commands. It starts off by adding our bridge, then sets up a controller address which the
-switch connects to (if it was specified as none inside the topology.py file, we do not implement this).
+This function takes in a switch name, in the format 'sw#', ex: 'sw1' and reads the
+datapath id of its bridge, the mac and of port of its internal port and the of port
+of the vxlan port to every node this switch connects to, both the connections found
+inside the topology[sw#] and the connections to that switch found in another
+switch's dictionary values.
 
-The two for loops inside this function establish a vxlan configuration for every node this switch connects to.
-The first for loop takes care of the connections found inside the topology[sw#] = '.... establishes everything here....'
-and the second for loop establishes the connections to that switch found in another switch's dictionary values.
+All of it comes from one ovs-vsctl query of the switch's bridges and interfaces.
 
 Example:
 topology['sw1'] = [('h1', '192.168.200.10'),'sw3']
 topology['sw2'] = ['sw1']
 topology['sw3'] = [('h2', '192.168.200.11')]
 
-The first for loop establishes the vxlands for h1 and sw3 and the second for loop
-establishes the connection to sw2
+For sw1 the loop reads the vxlan ports to h1, sw3 and sw2
 """
 def setupSwitch(switch):
         print "working on switch %s\n" %switch
-        fixed_ip= fxdict[switch]
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(fixed_ip, username=u_dict.get(switch, vm_user_name), key_filename=private_key_file)
-        time.sleep(2)
-        # running the ovs commands
         if switch not in nodes:
             print "Switch %s was not defined in 'nodes', setting up using default ovs commands" % switch
         bridge_name = 'br1'
         if 'bridge_name' in nodes[switch]:
             bridge_name = nodes[switch]['bridge_name']
-        stdin, stdout, stderr = ssh.exec_command("sudo ovs-vsctl get bridge %s datapath_id" % bridge_name)
-        stdin.close()
-        dpid=(''.join(stdout.readlines())).strip("\n");
+        state = ovs.read_state(sessions, switch)
+        if bridge_name not in state.bridges:
+            raise Exception("bridge %s not found on %s" % (bridge_name, switch))
+        dpid = state.bridges[bridge_name]['dpid']
         print "datapath_id of %s is %s\n" %(bridge_name, dpid)
-        time.sleep(1)
+        manifest.record(switch, dpid=dpid)
         if 'int_ip' in nodes[switch]:
             int_ip_name = nodes[switch]['int_ip'][0]
             int_ip = nodes[switch]['int_ip'][1]
-            #ssh.exec_command("sudo ovs-vsctl add-port %s %s -- set interface %s type=internal " % (bridge_name,int_ip_name, int_ip_name))
-            #time.sleep(1)     
-            stdin, stdout, stderr = ssh.exec_command("sudo ovs-vsctl get interface %s mac_in_use" % (int_ip_name));
-            stdin.close()
-            stdin2, stdout2, stderr2 = ssh.exec_command("sudo ovs-vsctl get interface %s ofport" % (int_ip_name));
-            stdin.close()
-            mac=(''.join(stdout.readlines())).strip("\n")
-            of_port=(''.join(stdout2.readlines())).strip("\n")
+            port = state.ports.get(int_ip_name, {})
+            mac = port.get('mac')
+            of_port = port.get('ofport')
             print "mac of %s is %s, of port is %s\n" %(int_ip, mac, of_port)
-            ports.setdefault(int_ip, {})
-            ports[int_ip]['dpid']=dpid
-            ports[int_ip]['mac']=mac
-            ports[int_ip]['of_port']=of_port
-            time.sleep(1) 
-        # this will hold the internal ip for use in the vxlan set up
-        connectip = ''
-        # this is used for the vxlan count and VLNI number (this must be the same on both sides)
-        vlni = 0
-        # used to implement a different VLNI number. For the cases of multiple connections to the same node
-        vnlilist = []
-        # this 'host' is every node consisting of triplette or switch name for that switch
-        for host in topology[switch]:
-            # handle hosts 
-            if isinstance(host, tuple):
-                #vlni = int(host[0][1]) + int(switch[2]) + (2*numSwitches) + 10
-                #vlni += vnlilist.count(vlni)
-                #vnlilist.append(vlni)
-                vlni = _get_vni(host[0], switch)
-                connectip = fxdict[host[0]]
-                ip_of_port = host[1] 
-                stdin, stdout, stderr = ssh.exec_command("sudo ovs-vsctl get interface vxlan%s ofport" % (vlni))
-                stdin.close()
-                of_port=(''.join(stdout.readlines())).strip("\n")
-                print "of port to %s is %s\n" %(ip_of_port, of_port)
-                ports.setdefault(ip_of_port, {})
-                ports[ip_of_port]['dpid']=dpid
-                ports[ip_of_port]['of_port']=of_port
-            # handle switches
-            else: 
-                #vlni = int(host[2]) + int(switch[2]) + 10
-                #vlni += vnlilist.count(vlni)
-                #vnlilist.append(vlni)
-                vlni = _get_vni(host, switch)
-                connectip = fxdict[host]
-            time.sleep(1)
-        # establishes all the other connections to this switch 
-        for keys in topology.keys():
-            for host in topology[keys]:
-                if (host == switch):
-                    connectip = fxdict[keys]
-                    #vlni = int(keys[2]) + int(switch[2]) + 10 
-                    #vlni += vnlilist.count(vlni)
-                    #vnlilist.append(vlni)
-                    vlni = _get_vni(keys, switch)
-                    #ssh.exec_command("sudo ovs-vsctl add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name, vlni, vlni,connectip, vlni))
-                    stdin, stdout, stderr = ssh.exec_command("sudo ovs-vsctl get interface vxlan%s ofport" % (vlni))
-                    stdin.close()
-                    print "of port to %s is %s\n" %(connectip, (''.join(stdout.readlines())))
-                    time.sleep(1)
-        ssh.close()
+            host_map.add(switch, int_ip, dpid=dpid, mac=mac, of_port=of_port)
+            manifest.record_port(switch, int_ip_name, mac=mac, ofport=of_port)
+        # every link of this switch, whichever side of the topology lists it
+        for link in graph.links_of(switch):
+            peer = link.other(switch)
+            # the VLNI number of the link (the same on both sides)
+            vlni = link.vni
+            of_port = state.ports.get("vxlan%s" % vlni, {}).get('ofport')
+            manifest.record_port(switch, "vxlan%s" % vlni, ofport=of_port)
+            if link.host:
+                print "of port to %s is %s\n" %(link.ip, of_port)
+                host_map.add(switch, link.ip, dpid=dpid, of_port=of_port)
+            else:
+                print "of port to %s is %s\n" %(fxdict[peer], of_port)
 
 """
-This function takes in a host name, in the format 'h#', ex: 'h1' and runs several
-ovs-vsctl commands. It starts off by adding a bridge and internal port for every connection
-to/from this host. The internal IP can be set to none, in this case we do not implement it
+This function takes in a host name, in the format 'h#', ex: 'h1' and reads the mac
+of the internal port of every connection to/from this host, with one ovs-vsctl query.
 
-The for loop inside this function performs the exact same as the 2nd for loop inside setupSwitches
+The links of the host are taken from the topology graph, in the order they appear in 'topology'
 """
 def setupHosts(host):
         print "working on host %s\n" %host
-        fixed_ip= fxdict[host]
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(fixed_ip, username=u_dict.get(host, vm_user_name), key_filename=private_key_file)
-        time.sleep(3)
-        # running the ovs commands
-        count = 0
-        connectip = ''
-        vlni = 0
-        vnlilist = []
-        for keys in topology.keys():
-            # this 'hosts' is every node consisting of triplette or switch name for that switch
-            for hosts in topology[keys]:
-                # if true, this is a triplette belonging to this desired host
-                if (hosts[0] == host):
-                    # third element is the bridge name
-                    try:
-                        if hosts[2]:
-                            bridge_name = hosts[2]
-                    except:
-                        bridge_name = 'br%s' % count
-                    stdin, stdout, stderr = ssh.exec_command("sudo ovs-vsctl get interface p%s mac_in_use" % (count));
-                    mac=(''.join(stdout.readlines())).strip("\n")
-                    print "mac of %s is %s" %(hosts[1], mac)
-                    ports.setdefault(hosts[1], {})
-                    ports[hosts[1]]['mac']=mac
-                    connectip = fxdict[keys]
-                    #vlni = int(keys[2]) + int(host[1]) + (2*numSwitches) + 10
-                    #vlni += vnlilist.count(vlni)
-                    #vnlilist.append(vlni)
-                    vlni = _get_vni(keys, host)
-                    count += 1
-        ssh.close()
+        state = ovs.read_state(sessions, host)
+        for link in graph.links_of(host):
+            mac = state.ports.get(link.port, {}).get('mac')
+            print "mac of %s is %s" %(link.ip, mac)
+            host_map.add(host, link.ip, mac=mac)
+            manifest.record_port(host, link.port, mac=mac)
+
+"""
+Reads a single node, switch or host. The nodes are independent of each other
+so this is what the worker pool runs for every node in the topology.
+In refresh mode a node whose configuration did not change since the last map
+keeps what it reported then and is not read.
+"""
+def setupNode(node):
+        sig = hostmap.signature(graph, nodes, manifest, node)
+        if refresh and host_map.unchanged(node, sig):
+            print "%s unchanged, using %s\n" % (node, host_map.path)
+            return
+        host_map.start(node)
+        with tracing.span('info', node):
+            if graph.is_switch(node):
+                setupSwitch(node)
+            else:
+                setupHosts(node)
+        host_map.finish(node, sig)
 
 
 print "\n\n"
@@ -350,6 +226,8 @@ print "\n"
 fxdict= {}
 i_name_dict={}
 vmdict={}
+# quantum port id of every node
+port_ids= {}
 # backup of the default parameters as specified inside the config.py file
 fixedRegion_name = region_name
 fixedimage_name = image_name
@@ -362,10 +240,12 @@ if True:
         try:
             # this list holds the servers (vms)
             servers_list=[]
+            # the region of every server, for the status polling
+            tracked = []
             # this list holds each node's pretty table object
             table_list = []
-            finished_servers = []
             # launch all of the VMs without checking the active state
+            tracing.phase('discovery')
             for i in range(numNodes): 
                 """
                 Parse the 'nodes' dictionary as defined in the topology.py file
@@ -406,15 +286,26 @@ if True:
                     flavor_name = fixedflavor_name
                     image_name = fixedimage_name
                     instance_name = fixedInstancename + "%s" % (nodeName)
-                                    
 
-                c=nclient.Client(user, password, tenant_name, auth_url, region_name=region_name, no_cache=True)
+                # a node recorded in the manifest is used as it is, without asking the cloud
+                entry = manifest.usable(nodeName, instance_name, region_name)
+                if entry is not None:
+                    print_msg("\nUsing VM %s of %s from %s" % (instance_name, nodeName, manifest.path))
+                    vmdict[nodeName] = entry['vm_id']
+                    fxdict[nodeName] = entry['fixed_ip']
+                    u_dict[nodeName] = entry.get('user', u_name)
+                    if 'port_id' in entry:
+                        port_ids[nodeName] = entry['port_id']
+                    sessions.register(nodeName, fxdict[nodeName], u_dict[nodeName])
+                    continue
+
+                c=clients.nova(region_name)
                 #instance_name = fixedInstancename + "%s" % (nodeName)
                 print_msg("\nTesting VM %d/%d (%s / %s) on region: %s" % (i+1, numNodes, nodeName, instance_name, region_name))
 
                 i_name_dict[instance_name]=nodeName
                 #create quantum client for floating ip address creation/association and VM network
-                quantum=qclient.Client(username=user, password=password, tenant_name=tenant_name, auth_url=auth_url, region_name=region_name)
+                quantum=clients.quantum(region_name)
                 #look for network id of the external network
                 _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', tenant_name+'-net')
                 v_nics=[]
@@ -430,76 +321,55 @@ if True:
                 v_nics.append(v_nic)
                 #print s1
 
-                servers=c.servers.list()
-                s1=None
-                for server in servers:
-                    if server.name == instance_name:
-                        s1 = server
-                        print "found\n"
-                        break
-                if s1 is None or s1.name != instance_name:
+                s1=server_index.find(region_name, instance_name)
+                if s1 is None:
                     print "cant find this server: %s\n" %instance_name
                     sys.exit(0)
+                print "found\n"
                 x.add_row(["VM ID",s1.id])
                 # note, here we do not have the internal ips. So we specify the server id with that node's name
                 vmdict["%s" % (nodeName)] = s1.id
+                tracing.alias(instance_name, nodeName)
                 u_dict[nodeName] = u_name
+                manifest.record(nodeName, vm_id=s1.id, name=instance_name, region=region_name, user=u_name)
                 servers_list.append(s1)
                 table_list.append(x)
+                tracked.append((region_name, s1))
             
-            # Wait until every VM has booted up. Checks the active/error state of the VMs
-            fixed_ip = None
-            srv_cnt = 0
-            for i in range (1, 50):
-                srv_cnt = 0
-                for s1 in servers_list:
-                    s1.get()
-                    if s1.status == "ERROR":
-                        srv_cnt += 1
-                        if s1.id in finished_servers:
-                           continue;
-                        finished_servers.append(s1.id)
-                        print_msg("server is in error")
-                    elif s1.status == "ACTIVE":
-                        srv_cnt += 1
-                        if s1.id in finished_servers:
-                           continue;
-                        finished_servers.append(s1.id)
-                        (s_net, s_ip)=s1.networks.popitem()
-                        if fixed_ip is None:
-                            fixed_ip = s_ip[0]
-                if srv_cnt >= len(servers_list):
-                    print_msg("All servers are done")
-                    break    
-                print_msg("server count is %s/%s " % (srv_cnt, numNodes))
-                time.sleep(1)
+            # Wait until every VM has booted up, reading the state of all of them with one call per region
+            waiter = cloud.ServerWaiter(clients, fixedInstancename)
+            tracing.phase('wait-active')
+            waiter.wait(tracked)
 
             # This forloop updates our 'fxdict' dict and matches the internal ips with that node name
             tempcount = 0
             for s1 in servers_list:
-                s1.get()
                 if s1.status == "ACTIVE":
                    (s_net, s_ip)=s1.networks.popitem()
                    # add in the internal ip for that node 
                    for key in vmdict:
                         if (vmdict[key] == s1.id):
                             fxdict[key] = s_ip[0]            
+                            manifest.record(key, fixed_ip=s_ip[0])
+                            sessions.register(key, s_ip[0], u_dict.get(key, vm_user_name))
                    checkServer(s1)                       #-----------------------------
                    table_list[tempcount].add_row(["Host",str(getattr(s1, "OS-EXT-SRV-ATTR:host"))])
                    table_list[tempcount].add_row(["Instance Name",str(getattr(s1, "OS-EXT-SRV-ATTR:instance_name"))])
                    table_list[tempcount].add_row(["Interal IP addr", s_ip[0]])
                    tempcount += 1
 
-            # get a list of port id in quantum
-            q_ports=quantum.list_ports()
-
-            #look for the port is of the server port
-            for port in q_ports['ports']:
-                    ips=port['fixed_ips']
-                    for ip in ips:
-                        if ip['ip_address'] == fixed_ip:
-                                pid=port['id']
-                                break
+            # the quantum port of every node, from queries filtered on the VM ids
+            tracing.phase('ports')
+            port_index = cloud.PortIndex(clients)
+            port_index.load(tracked)
+            for tempcount, s1 in enumerate(servers_list):
+                for key in vmdict:
+                    if vmdict[key] == s1.id and port_index.by_device(s1.id):
+                        port_ids[key] = port_index.by_device(s1.id)[0]['id']
+                        manifest.record(key, port_id=port_ids[key])
+                        table_list[tempcount].add_row(["Port ID", port_ids[key]])
+            manifest.record_links(graph, nodes)
+            manifest.save()
 
             # loop over and print out the tables. They are in the pretty table format
             tempcount = 0
@@ -508,9 +378,6 @@ if True:
                 print "\n"
                 tempcount += 1
 
-            #look for network id of the external network
-            _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', 'ext_net')
-
             print fxdict
             wait_before_ssh=3
             for s1 in []: #servers_list:
@@ -562,41 +429,32 @@ if True:
                     out1 = ""
                     out2 = ""
                     try:
-                        ssh = paramiko.SSHClient()
-                        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                        ssh.connect(fixed_ip, username=u_dict.get(i_name_dict[s1.name], vm_user_name), key_filename=private_key_file)
-                        time.sleep(1)
-    
-                        stdin, stdout, stderr = ssh.exec_command("uptime")
-                        stdin.close()
-                        out1=stdout.readlines()
-                        print_msg("uptime output is: %s" % (''.join(out1)))
-                        time.sleep(1)
-    
-                        stdin, stdout, stderr = ssh.exec_command("ping -c2 www.google.ca")
-                        stdin.close()
-                        out2=stdout.readlines()
-                        print_msg("ping output is: %s" % (''.join(out2)))
-                        ssh.close() 
-                        # running the ovs commands
+                        out1 = sessions.run(i_name_dict[s1.name], "uptime").stdout
+                        print_msg("uptime output is: %s" % out1)
+                        # no internet access is not fatal for the overlay
+                        out2 = sessions.run(i_name_dict[s1.name], "ping -c2 www.google.ca", check=False).stdout
+                        print_msg("ping output is: %s" % out2)
                     except:
                         print_msg("Ssh failed. If the edge is overloaded, allocate more time before the SSH check")
     
-            # set up the controllers
-            # the value "switch" being passed in is in the form of 'sw#'
-            for switch in topology.keys():
-                setupSwitch(switch) 
-                        
-            # set up the hosts
-            # the value "host" being passed in is in the form of 'h#'
-            for host in hostList:
-                setupHosts(host)    
+            # read the switches and the hosts, all of them at the same time
+            tracing.phase('info')
+            results = run_parallel(setupNode, topology.keys() + hostList)
+            print_results(results, "Port information")
+            tracing.finish("Timing")
+
+            manifest.save()
+            host_map.keep(nodeList)
+            host_map.save()
+            print "host locations written to %s" % host_map.path
 
             #print ports
+            ports = host_map.hosts()
             print "\n"
             for port_ip, val in ports.iteritems():
-                print "ip=\"%s\";mac=%s;dpid=%s;port=%s\n" % (port_ip, val['mac'], val['dpid'],val['of_port'])
+                print "ip=\"%s\";mac=\"%s\";dpid=\"%s\";port=%s\n" % (port_ip, val.get('mac'), val.get('dpid'), val.get('of_port'))
             print "\nAll Finished, you can now access your VMs \n\n"
+            sessions.close()
                         
         except:
             print "Failed to launch VMs. Check your keystone credentials"
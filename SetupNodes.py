@@ -40,13 +40,17 @@ from novaclient import exceptions
 
 from config import user, password, auth_url 
 from config import instance_name, key_name, private_key_file, pub_key, key_name
-from config import image_name, flavor_name, sec_group_name, vm_user_name, wait_before_ssh
+from config import image_name, flavor_name, sec_group_name, vm_user_name
 from config import tenant_name, region_name 
 
-from keystoneclient.v2_0 import client as ksclient
-import re
 from prettytable import PrettyTable
+from parallel import run_parallel, print_results, region_workers
+import cloud
+import tracing
+import placement
 from topology import topology, nodes
+from graph import Graph
+from manifest import Manifest
 
 
 def print_msg(msg):
@@ -54,40 +58,17 @@ def print_msg(msg):
     print msg
 
 """
-Here we parse the 'topology' dictionary found inside topology.py and extract 
-a list 'nodeList' which stores the names of every Node
+Here we parse the 'topology' dictionary found inside topology.py into a graph of
+its nodes and links, and extract a list 'nodeList' which stores the names of every Node
 """
-# parse the user topology
-valuelist = []
-for values in topology.values():
-    for tuples in values:
-        # we only want the hosts 
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in valuelist):
-                valuelist.append(tuples[0])
-
-numHosts = len(valuelist)
-numSwitches = len(topology.keys())
-numNodes = numHosts + numSwitches
-
-# this list contains the switch names and host names
-nodeList = []
-# start off by appending the switche names
-for key in topology.keys():
-    if (key not in nodeList):
-        nodeList.append(key)
-
-# this list only holds the host names (used to append into the nodeList)
-hostList = []
-for values in topology.values():
-    for tuples in values:
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in hostList):
-                hostList.append(tuples[0])
-
-hostList.sort()
-for elem in hostList:
-    nodeList.append(elem)
+# parse the user topology into its nodes and links
+graph = Graph(topology)
+hostList = graph.hosts
+nodeList = graph.node_list()
+
+numHosts = len(hostList)
+numSwitches = len(graph.switches)
+numNodes = len(nodeList)
 
 
 try:
@@ -97,192 +78,38 @@ except:
     print "cant open key file: %s" %private_key_file
     sys.exit(0)
 
+# nova and quantum clients of every region, sharing one keystone token
+clients = cloud.ClientFactory(user, password, tenant_name, auth_url)
+# ssh, vxlan and icmp rules of sec_group_name, checked once per region
+secgroups = cloud.SecurityGroupSync(clients, sec_group_name)
+# the servers of every region by name, listed once per region
+server_index = cloud.ServerIndex(clients, instance_name)
+# what the earlier scripts recorded about the deployment, see manifest.py
+manifest = Manifest()
+manifest.load()
 
-# three functions needed for whale client connection
-def _strip_version(endpoint):
-        """Strip a version from the last component of an endpoint if present"""
-
-        # Get rid of trailing '/' if present
-        if endpoint.endswith('/'):
-            endpoint = endpoint[:-1]
-        url_bits = endpoint.split('/')
-        # regex to match 'v1' or 'v2.0' etc
-        if re.match('v\d+\.?\d*', url_bits[-1]):
-            endpoint = '/'.join(url_bits[:-1])
-        return endpoint
-
-
-def _get_ksclient(**kwargs):
-        """Get an endpoint and auth token from Keystone.
-
-        :param username: name of user
-        :param password: user's password
-        :param tenant_id: unique identifier of tenant
-        :param tenant_name: name of tenant
-        :param auth_url: endpoint to authenticate against
-        """
-        return ksclient.Client(username=kwargs.get('username'),
-                               password=kwargs.get('password'),
-                               tenant_id=kwargs.get('tenant_id'),
-                               tenant_name=kwargs.get('tenant_name'),
-                               auth_url=kwargs.get('auth_url'),
-                               insecure=kwargs.get('insecure'))
-
-def _get_endpoint(client, **kwargs):
-        """Get an endpoint using the provided keystone client."""
-
-        service_type = kwargs.get('service_type') or 'configuration'
-        endpoint_type = kwargs.get('endpoint_type') or 'publicURL'
-        region = kwargs.get('region')
-        if region is not None:
-                endpoint = client.service_catalog.url_for(
-                             attr='region',
-                             filter_value=region, 
-                             service_type=service_type,
-                             endpoint_type=endpoint_type)
-        else:
-                endpoint = client.service_catalog.url_for(
-                             service_type=service_type,
-                             endpoint_type=endpoint_type)
-
-        return _strip_version(endpoint)
+# the region of the nodes without one, when 'region_assignment' is set in config.py;
+# the VMs recorded by an earlier run stay where they are
+placement.assign_regions(graph, nodes, region_name, clients, manifest)
+# the compute host of every node, when 'placement_hosts' is set in config.py
+placement_plan = placement.plan(graph, nodes, region_name)
 
 
 def check_host(server, host):
-        server.get()
+        # a server from the status polling already has its host
+        if not hasattr(server, "OS-EXT-SRV-ATTR:host"):
+            server.get()
         if hasattr(server, "OS-EXT-SRV-ATTR:host"):
                 return getattr(server, "OS-EXT-SRV-ATTR:host") == host
         return False
 
 def checkServer(server):
-        server.get()
+        # a server from the status polling already has its fault, if any
+        if not hasattr(server, "status"):
+            server.get()
         if hasattr(server, "fault"):
             print_msg("error fault is " + str(getattr(server, "fault")) + "\n")
 
-"""
-This function takes in a switch name, in the format 'sw#', ex: 'sw1' and runs several
-ovs-vsctl commands. It starts off by adding our bridge, then sets up a controller address which the
-switch connects to (if it was specified as none inside the topology.py file, we do not implement this).
-
-The two for loops inside this function establish a vxlan configuration for every node this switch connects to.
-The first for loop takes care of the connections found inside the topology[sw#] = '.... establishes everything here....'
-and the second for loop establishes the connections to that switch found in another switch's dictionary values.
-
-Example:
-topology['sw1'] = [('h1', '192.168.200.10'),'sw3']
-topology['sw2'] = ['sw1']
-topology['sw3'] = [('h2', '192.168.200.11')]
-
-The first for loop establishes the vxlands for h1 and sw3 and the second for loop
-establishes the connection to sw2
-"""
-def setupSwitch(switch):
-        fixed_ip= fxdict[switch]
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(fixed_ip, username=vm_user_name, key_filename=private_key_file)
-        time.sleep(15)
-        # running the ovs commands
-        if switch not in nodes:
-            print "Switch %s was not defined in 'nodes', setting up using default ovs commands" % switch
-        bridge_name = 'br1'
-        if 'bridge_name' in nodes[switch]:
-            bridge_name = nodes[switch]['bridge_name']
-        ssh.exec_command("sudo ovs-vsctl add-br %s" % bridge_name)
-        time.sleep(2)
-        if 'contr_addr' in nodes[switch]:
-            ssh.exec_command("sudo ovs-vsctl set-controller %s tcp:%s" % (bridge_name, nodes[switch]['contr_addr']))
-            time.sleep(1)
-        if 'int_ip' in nodes[switch]:
-            int_ip_name = nodes[switch]['int_ip'][0]
-            int_ip = nodes[switch]['int_ip'][1]
-            ssh.exec_command("sudo ovs-vsctl add-port %s %s -- set interface %s type=internal" % (bridge_name,int_ip_name, int_ip_name))
-            time.sleep(1)     
-            ssh.exec_command("sudo ifconfig %s %s/24 up" %(int_ip_name, int_ip))
-            time.sleep(1) 
-        ssh.exec_command("sudo ovs-vsctl set-fail-mode %s secure" % bridge_name)
-        time.sleep(1)
-        ssh.exec_command("sudo ovs-vsctl set controller %s connection-mode=out-of-band"% bridge_name)
-        time.sleep(1) 
-        # this will hold the internal ip for use in the vxlan set up
-        connectip = ''
-        # this is used for the vxlan count and VLNI number (this must be the same on both sides)
-        vlni = 0
-        # used to implement a different VLNI number. For the cases of multiple connections to the same node
-        vnlilist = []
-        # this 'host' is every node consisting of triplette or switch name for that switch
-        for host in topology[switch]:
-            # handle hosts 
-            if isinstance(host, tuple):
-                vlni = int(host[0][1]) + int(switch[2]) + (2*numSwitches) + 10
-                vlni += vnlilist.count(vlni)
-                vnlilist.append(vlni)
-                connectip = fxdict[host[0]]
-            # handle switches
-            else: 
-                vlni = int(host[2]) + int(switch[2]) + 10
-                vlni += vnlilist.count(vlni)
-                vnlilist.append(vlni)
-                connectip = fxdict[host]
-            ssh.exec_command("sudo ovs-vsctl add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name,vlni,vlni,connectip,vlni))
-            time.sleep(1)
-        # establishes all the other connections to this switch 
-        for keys in topology.keys():
-            for host in topology[keys]:
-                if (host == switch):
-                    connectip = fxdict[keys]
-                    vlni = int(keys[2]) + int(switch[2]) + 10 
-                    vlni += vnlilist.count(vlni)
-                    vnlilist.append(vlni)
-                    ssh.exec_command("sudo ovs-vsctl add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name, vlni, vlni,connectip, vlni))
-                    time.sleep(1)
-        ssh.close()
-
-"""
-This function takes in a host name, in the format 'h#', ex: 'h1' and runs several
-ovs-vsctl commands. It starts off by adding a bridge and internal port for every connection
-to/from this host. The internal IP can be set to none, in this case we do not implement it
-
-The for loop inside this function performs the exact same as the 2nd for loop inside setupSwitches
-"""
-def setupHosts(host):
-        fixed_ip= fxdict[host]
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(fixed_ip, username=vm_user_name, key_filename=private_key_file)
-        time.sleep(15)
-        # running the ovs commands
-        count = 0
-        connectip = ''
-        vlni = 0
-        vnlilist = []
-        for keys in topology.keys():
-            # this 'hosts' is every node consisting of triplette or switch name for that switch
-            for hosts in topology[keys]:
-                # if true, this is a triplette belonging to this desired host
-                if (hosts[0] == host):
-                    # third element is the bridge name
-                    try:
-                        if hosts[2]:
-                            bridge_name = hosts[2]
-                    except:
-                        bridge_name = 'br%s' % count
-                    ssh.exec_command("sudo ovs-vsctl add-br %s" % bridge_name)
-                    time.sleep(2)
-                    ssh.exec_command("sudo ovs-vsctl add-port %s p%s -- set interface p%s type=internal" % (bridge_name,count, count))
-                    time.sleep(1)
-                    if (hosts[1] != "None" or hosts[1] != "none"):
-                        ssh.exec_command("sudo ifconfig p%s %s/24 up" %(count, hosts[1]))
-                        time.sleep(1)
-                    connectip = fxdict[keys]
-                    vlni = int(keys[2]) + int(host[1]) + (2*numSwitches) + 10
-                    vlni += vnlilist.count(vlni)
-                    vnlilist.append(vlni)
-                    ssh.exec_command("sudo ovs-vsctl add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name,vlni,vlni,connectip,vlni))
-                    time.sleep(1)
-                    count += 1
-        ssh.close()
-
 
 print "\n\n"
 print "----------- NETWORK TOPOLOGY -----------\n"
@@ -309,6 +136,91 @@ fixedInstancename = instance_name
 
 done = False
 
+# position of each node in the launch order, printed as the VM number
+vm_number = dict((node, i + 1) for i, node in enumerate(nodeList))
+
+"""
+Launches the VM of one node, as described in the 'nodes' dictionary. The create calls
+of several nodes are sent at the same time, see 'max_workers' and 'region_workers'
+"""
+def launchNode(nodeName):
+        """
+        Parse the 'nodes' dictionary as defined in the topology.py file
+        and set the variables before that specific VM launches
+        """
+        server_name = None
+        u_name = vm_user_name
+        try:
+            if nodeName in nodes: 
+                u_name = nodes[nodeName].get('vm_user_name', vm_user_name)
+                server_name = nodes[nodeName].get('server', None)
+                region_name = nodes[nodeName].get('region', fixedRegion_name)
+                flavor_name = nodes[nodeName].get('flavor', fixedflavor_name)
+                image_name = nodes[nodeName].get('image', fixedimage_name)
+                instance_name = nodes[nodeName].get('name', fixedInstancename + "%s" % (nodeName))
+            else:
+                region_name = fixedRegion_name
+                flavor_name = fixedflavor_name
+                image_name = fixedimage_name
+                instance_name = fixedInstancename + "%s" % (nodeName)
+        except:
+            print "\n\n --------- ERROR IN THE NODES DICTIONARY on key %s-------------" %nodeName
+            print " using defualt parameters to launch"
+            region_name = fixedRegion_name
+            flavor_name = fixedflavor_name
+            image_name = fixedimage_name
+            instance_name = fixedInstancename + "%s" % (nodeName)
+        if server_name is None:
+            server_name = placement_plan.get(nodeName)
+
+        print_msg("\nLaunching VM %d/%d on region: %s" % (vm_number[nodeName], numNodes, region_name))
+        c=clients.nova(region_name)
+
+        image1=nshell._find_image(c, image_name)
+        flavor1=nshell._find_flavor(c, flavor_name)
+
+        seclist=[]
+        seclist.append(sec_group_name)
+
+        # the first node of a region adds the missing rules, the others skip it
+        secgroups.sync(region_name)
+
+        #create quantum client for floating ip address creation/association and VM network
+        quantum=clients.quantum(region_name)
+        #look for network id of the external network
+        _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', tenant_name+'-net')
+        v_nics=[]
+        v_nic={}
+
+        x = PrettyTable(["Property", "Value"])
+        x.add_row(["VM name", instance_name])
+        x.add_row(["VM number", vm_number[nodeName]])
+        x.add_row(["Network ID",_network_id])
+        v_nic['net-id']=_network_id
+        v_nic['v4-fixed-ip']=None
+        v_nics.append(v_nic)
+        hints={}
+        if server_name:
+            hints['force_hosts']=server_name
+        s1=server_index.find(region_name, instance_name)
+        if s1 is None:
+            print "creating VM"
+            with tracing.span('create', nodeName):
+                s1=c.servers.create(instance_name, image1, flavor1, key_name=key_name, security_groups=seclist, scheduler_hints=hints, nics=v_nics)
+        else:
+            print "found"
+        #print s1
+        x.add_row(["VM ID",s1.id])
+        # note, here we do not have the internal ips. So we specify the server id with that node's name
+        fxdict[nodeName] = s1.id
+        manifest.record(nodeName, vm_id=s1.id, name=instance_name, region=region_name, user=u_name)
+        return (s1, x)
+
+
+def nodeRegion(nodeName):
+        return nodes.get(nodeName, {}).get('region', fixedRegion_name)
+
+
 if True:       
         s1 = None
         quantum = None
@@ -318,93 +230,21 @@ if True:
             # this list holds each node's pretty table object
             table_list = []
             finished_servers = []
-            # launch all of the VMs without checking the active state
-            for i in range(numNodes): 
-                """
-                Parse the 'nodes' dictionary as defined in the topology.py file
-                and set the variables before that specific VM launches
-                """
-                nodeName = nodeList[i]
-                server_name = None
-                try:
-                    if nodeName in nodes: 
-                        u_name = nodes[nodeName].get('vm_user_name', vm_user_name)
-                        server_name = nodes[nodeName].get('server', None)
-                        region_name = nodes[nodeName].get('region', fixedRegion_name)
-                        flavor_name = nodes[nodeName].get('flavor', fixedflavor_name)
-                        image_name = nodes[nodeName].get('image', fixedimage_name)
-                        instance_name = nodes[nodeName].get('name', fixedInstancename + "%s" % (nodeName))
-                    else:
-                        region_name = fixedRegion_name
-                        flavor_name = fixedflavor_name
-                        image_name = fixedimage_name
-                        instance_name = fixedInstancename + "%s" % (nodeName)
-                except:
-                    print "\n\n --------- ERROR IN THE NODES DICTIONARY on key %s-------------" %nodeName
-                    print " using defualt parameters to launch"
-                    region_name = fixedRegion_name
-                    flavor_name = fixedflavor_name
-                    image_name = fixedimage_name
-                    instance_name = fixedInstancename + "%s" % (nodeName)
-                                    
-
-                print_msg("\nLaunching VM %d/%d on region: %s" % (i+1, numNodes, region_name))
-                c=nclient.Client(user, password, tenant_name, auth_url, region_name=region_name, no_cache=True)
-                time.sleep(5)
-            
-                image1=nshell._find_image(c, image_name)
-                flavor1=nshell._find_flavor(c, flavor_name)
-
-                seclist=[]
-                seclist.append(sec_group_name)
-
-                secgroup=nshell._get_secgroup(c, sec_group_name)
-                try:
-                    c.security_group_rules.create(secgroup.id, "TCP", 22, 22, "10.0.0.0/8")
-                except:
-                    pass
-                try:
-                    c.security_group_rules.create(secgroup.id, "UDP", 4789, 4789, "10.0.0.0/8")
-                except:
-                    pass
-                try:
-                    c.security_group_rules.create(secgroup.id, "ICMP", -1, 255, "10.0.0.0/8")
-                except:
-                    pass
-
-                #create quantum client for floating ip address creation/association and VM network
-                quantum=qclient.Client(username=user, password=password, tenant_name=tenant_name, auth_url=auth_url, region_name=region_name)
-                #look for network id of the external network
-                _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', tenant_name+'-net')
-                v_nics=[]
-                v_nic={}
-
-                x = PrettyTable(["Property", "Value"])
-                x.add_row(["VM name", instance_name])
-                x.add_row(["VM number", i+1])
-                x.add_row(["Network ID",_network_id])
-                v_nic['net-id']=_network_id
-                v_nic['v4-fixed-ip']=None
-                v_nics.append(v_nic)
-                hints={}
-                if server_name:
-                    hints['force_hosts']=server_name
-                servers=c.servers.list()
-                s1=None
-                for server in servers:
-                    if server.name == instance_name:
-                        s1 = server
-                        print "found"
-                        break
-                if s1 is None or s1.name != instance_name:
-                    print "creating VM"
-                    s1=c.servers.create(instance_name, image1, flavor1, key_name=key_name, security_groups=seclist, scheduler_hints=hints, nics=v_nics)
-                #print s1
-                x.add_row(["VM ID",s1.id])
-                # note, here we do not have the internal ips. So we specify the server id with that node's name
-                fxdict[nodeName] = s1.id
-                servers_list.append(s1)
-                table_list.append(x)
+            # launch all of the VMs without checking the active state, several create calls at a time
+            placement.print_regions(graph, nodes, region_name)
+            placement.print_plan(graph, placement_plan)
+            tracing.phase('launch')
+            results = run_parallel(launchNode, nodeList, group=nodeRegion, limits=region_workers)
+            print_results(results, "VM launch")
+            for result in results:
+                if result.ok:
+                    (s1, x) = result.value
+                    servers_list.append(s1)
+                    table_list.append(x)
+            manifest.record_links(graph, nodes)
+            manifest.save()
+            tracing.finish("Timing")
+            print "VMs recorded in %s" % manifest.path
             print "********************************************************"
             print "please wait for a couple of more minutes and run ./GetInfomration.py to make sure VMs are ready"
             print "after VMs are ready, run SetupTopology.py to setup the topology links"
@@ -412,151 +252,6 @@ if True:
             print "Done. Now exiting."
             done = True
             sys.exit(0)
-            # Wait until every VM has booted up. Checks the active/error state of the VMs
-            fixed_ip = None
-            srv_cnt = 0
-            for i in range (1, 50):
-                srv_cnt = 0
-                for s1 in servers_list:
-                    s1.get()
-                    if s1.status == "ERROR":
-                        srv_cnt += 1
-                        if s1.id in finished_servers:
-                           continue;
-                        finished_servers.append(s1.id)
-                        print_msg("server is in error")
-                    elif s1.status == "ACTIVE":
-                        srv_cnt += 1
-                        if s1.id in finished_servers:
-                           continue;
-                        finished_servers.append(s1.id)
-                        (s_net, s_ip)=s1.networks.popitem()
-                        if fixed_ip is None:
-                            fixed_ip = s_ip[0]
-                if srv_cnt >= len(servers_list):
-                    print_msg("All servers are done")
-                    break    
-                print_msg("server count is %s/%s " % (srv_cnt, numNodes))
-                time.sleep(10)
-
-            # This forloop updates our 'fxdict' dict and matches the internal ips with that node name
-            tempcount = 0
-            for s1 in servers_list:
-                s1.get()
-                if s1.status == "ACTIVE":
-                   (s_net, s_ip)=s1.networks.popitem()
-                   # add in the internal ip for that node 
-                   for key in fxdict:
-                        if (fxdict[key] == s1.id):
-                            fxdict[key] = s_ip[0]            
-                   checkServer(s1)                       #-----------------------------
-                   table_list[tempcount].add_row(["Host",str(getattr(s1, "OS-EXT-SRV-ATTR:host"))])
-                   table_list[tempcount].add_row(["Instance Name",str(getattr(s1, "OS-EXT-SRV-ATTR:instance_name"))])
-                   table_list[tempcount].add_row(["Interal IP addr", s_ip[0]])
-                   tempcount += 1
-
-            # get a list of port id in quantum
-            ports=quantum.list_ports()
-
-            #look for the port is of the server port
-            for port in ports['ports']:
-                    ips=port['fixed_ips']
-                    for ip in ips:
-                        if ip['ip_address'] == fixed_ip:
-                                pid=port['id']
-                                break
-
-            # loop over and print out the tables. They are in the pretty table format
-            tempcount = 0
-            for s1 in servers_list:
-                print table_list[tempcount]
-                print "\n"
-                tempcount += 1
-
-            #look for network id of the external network
-            _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', 'ext_net')
-
-            if True:
-                s1 = servers_list[-1]
-                fixed_ip = fxdict.values()[-1]
-                print_msg("waiting %d seconds before ssh test" %wait_before_ssh)
-                time.sleep(wait_before_ssh)
-
-                try:
-                    for i in range (1, 5):
-                        s1.get()
-                        server_console_output = s1.get_console_output()
-                        if s1.status == "ACTIVE" and ("Generation complete." not in server_console_output):
-                            if fixed_ip not in s1.get_console_output():
-                                print_msg("failed to get dhcp address %s \n" % fixed_ip)
-                            if "waiting 120 seconds for a network device" in server_console_output:
-                                print_msg("strange!: waiting 120 seconds for a network device")
-                            #print_msg("Please be patient, waiting another %d seconds \n" % wait_before_ssh)
-                            break
-                        elif s1.status == "ACTIVE":
-                            print_msg("Server console-log is fine: %s, %s, %s \n" %(s1.id, s1.name, fixed_ip))
-                            if fixed_ip not in s1.get_console_output():
-                            #shouldnt get here if key genration comepleted fine
-                                print_msg("failed to get dhcp address %s \n" % fixed_ip)
-                            break
-                        time.sleep(wait_before_ssh)
-                except:
-                    msg = msg + "\n exception in console-log check\n"
-                    pass
-
-                #ping fixed ip and print output
-                if fixed_ip is not None:
-                    str2="ping to fixedip %s failed " % fixed_ip 
-                    try:
-                        str1=subprocess.check_output(['ping', '-c 3', fixed_ip])
-                    except:
-                        pass
-                    try:
-                        str1=subprocess.check_output(['ping', '-c 3', fixed_ip])
-                        str2=str1
-                    except:
-                        pass
-                    print_msg(str2)
-
-                    #ssh to the server and execute a couple of commands for sanity test
-                    print_msg("starting ssh test")
-                    out1 = ""
-                    out2 = ""
-                    try:
-                        ssh = paramiko.SSHClient()
-                        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                        ssh.connect(fixed_ip, username=vm_user_name, key_filename=private_key_file)
-                        time.sleep(15)
-    
-                        stdin, stdout, stderr = ssh.exec_command("uptime")
-                        stdin.close()
-                        out1=stdout.readlines()
-                        print_msg("uptime output is: %s" % (''.join(out1)))
-                        time.sleep(3)
-    
-                        stdin, stdout, stderr = ssh.exec_command("ping -c2 www.google.ca")
-                        stdin.close()
-                        out2=stdout.readlines()
-                        print_msg("ping output is: %s" % (''.join(out2)))
-                        ssh.close() 
-                        # running the ovs commands
-                    except:
-                        print_msg("Ssh failed. If the edge is overloaded, allocate more time before the SSH check")
-    
-                    print "\nPlease wait roughly %s seconds as the VxLans are being set up\n" % (numNodes*30)
-                        
-                    # set up the controllers
-                    # the value "switch" being passed in is in the form of 'sw#'
-                    for switch in topology.keys():
-                        setupSwitch(switch) 
-                        
-                    # set up the hosts
-                    # the value "host" being passed in is in the form of 'h#'
-                    for host in hostList:
-                        setupHosts(host)    
-
-                    print "All Finished, you can now access your VMs \n\n"
-                        
         except:
            if done is False:
                print "Failed to launch VMs. Check your keystone credentials"
@@ -40,13 +40,28 @@ from novaclient import exceptions
 
 from config import user, password, auth_url 
 from config import instance_name, key_name, private_key_file, pub_key, key_name
-from config import image_name, flavor_name, sec_group_name, vm_user_name, wait_before_ssh
+from config import image_name, flavor_name, sec_group_name, vm_user_name
 from config import tenant_name, region_name 
 
-from keystoneclient.v2_0 import client as ksclient
-import re
 from prettytable import PrettyTable
+from parallel import run_parallel, print_results
+from ovs import Transaction
+import ovs
+import remote
+import cloud
+import sanity
+import tracing
+import placement
+import readiness
+from pipeline import Pipeline
 from topology import topology, nodes, contr_addr
+from graph import Graph
+from manifest import Manifest
+
+try:
+    from config import pipelined_setup
+except ImportError:
+    pipelined_setup = False
 
 
 def print_msg(msg):
@@ -54,40 +69,17 @@ def print_msg(msg):
     print msg
 
 """
-Here we parse the 'topology' dictionary found inside topology.py and extract 
-a list 'nodeList' which stores the names of every Node
+Here we parse the 'topology' dictionary found inside topology.py into a graph of
+its nodes and links, and extract a list 'nodeList' which stores the names of every Node
 """
-# parse the user topology
-valuelist = []
-for values in topology.values():
-    for tuples in values:
-        # we only want the hosts 
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in valuelist):
-                valuelist.append(tuples[0])
-
-numHosts = len(valuelist)
-numSwitches = len(topology.keys())
-numNodes = numHosts + numSwitches
-
-# this list contains the switch names and host names
-nodeList = []
-# start off by appending the switche names
-for key in topology.keys():
-    if (key not in nodeList):
-        nodeList.append(key)
-
-# this list only holds the host names (used to append into the nodeList)
-hostList = []
-for values in topology.values():
-    for tuples in values:
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in hostList):
-                hostList.append(tuples[0])
-
-hostList.sort()
-for elem in hostList:
-    nodeList.append(elem)
+# parse the user topology into its nodes and links
+graph = Graph(topology)
+hostList = graph.hosts
+nodeList = graph.node_list()
+
+numHosts = len(hostList)
+numSwitches = len(graph.switches)
+numNodes = len(nodeList)
 
 
 try:
@@ -97,236 +89,161 @@ except:
     print "cant open key file: %s" %private_key_file
     sys.exit(0)
 
+# one ssh session per node, shared by the sanity test and the ovs commands
+sessions = remote.SessionPool(private_key_file)
+
+# nova and quantum clients of every region, sharing one keystone token
+clients = cloud.ClientFactory(user, password, tenant_name, auth_url)
+# the servers of every region by name, listed once per region
+server_index = cloud.ServerIndex(clients, instance_name)
+# what the earlier scripts recorded about the deployment, see manifest.py
+manifest = Manifest()
+manifest.load()
+# entries of VMs deleted or failed since are looked up in the cloud again
+for node in manifest.revalidate(server_index):
+    print "VM of %s recorded in %s is gone or failed, looking it up again" % (node, manifest.path)
 
-# three functions needed for whale client connection
-def _strip_version(endpoint):
-        """Strip a version from the last component of an endpoint if present"""
-
-        # Get rid of trailing '/' if present
-        if endpoint.endswith('/'):
-            endpoint = endpoint[:-1]
-        url_bits = endpoint.split('/')
-        # regex to match 'v1' or 'v2.0' etc
-        if re.match('v\d+\.?\d*', url_bits[-1]):
-            endpoint = '/'.join(url_bits[:-1])
-        return endpoint
-
-
-def _get_ksclient(**kwargs):
-        """Get an endpoint and auth token from Keystone.
-
-        :param username: name of user
-        :param password: user's password
-        :param tenant_id: unique identifier of tenant
-        :param tenant_name: name of tenant
-        :param auth_url: endpoint to authenticate against
-        """
-        return ksclient.Client(username=kwargs.get('username'),
-                               password=kwargs.get('password'),
-                               tenant_id=kwargs.get('tenant_id'),
-                               tenant_name=kwargs.get('tenant_name'),
-                               auth_url=kwargs.get('auth_url'),
-                               insecure=kwargs.get('insecure'))
-
-def _get_endpoint(client, **kwargs):
-        """Get an endpoint using the provided keystone client."""
-
-        service_type = kwargs.get('service_type') or 'configuration'
-        endpoint_type = kwargs.get('endpoint_type') or 'publicURL'
-        region = kwargs.get('region')
-        if region is not None:
-                endpoint = client.service_catalog.url_for(
-                             attr='region',
-                             filter_value=region, 
-                             service_type=service_type,
-                             endpoint_type=endpoint_type)
-        else:
-                endpoint = client.service_catalog.url_for(
-                             service_type=service_type,
-                             endpoint_type=endpoint_type)
-
-        return _strip_version(endpoint)
+# the regions the nodes were launched in, when 'region_assignment' is set in config.py
+placement.assign_regions(graph, nodes, region_name, clients, manifest)
+# the compute host of every node, when 'placement_hosts' is set in config.py
+placement_plan = placement.plan(graph, nodes, region_name)
 
 
 def check_host(server, host):
-        server.get()
+        # a server from the status polling already has its host
+        if not hasattr(server, "OS-EXT-SRV-ATTR:host"):
+            server.get()
         if hasattr(server, "OS-EXT-SRV-ATTR:host"):
                 return getattr(server, "OS-EXT-SRV-ATTR:host") == host
         return False
 
 def checkServer(server):
-        server.get()
+        # a server from the status polling already has its fault, if any
+        if not hasattr(server, "status"):
+            server.get()
         if hasattr(server, "fault"):
             print_msg("error fault is " + str(getattr(server, "fault")) + "\n")
 
-def _calc_vni(node):
-    vn1 = 0
-    if node.lower().startswith('sw'):
-       vn1=node.lower()
-       vn1=int(vn1[2:]) + 500
-    elif node.lower().startswith('h'):
-       vn1=node.lower()
-       vn1=int(vn1[1:])
-    return vn1
-
-
-num_links={}
-
-def _get_vni(node1, node2):
-    vn1=_calc_vni(node1)
-    vn2=_calc_vni(node2)
-    d1=num_links.setdefault(node1, {})
-    d2=d1.setdefault(node2, 0)
-    num_links[node1][node2] += 1
-    if vn1 < vn2:
-        vn = vn1 * 16384 + vn2 * 16 + d2
-    else:
-        vn = vn2 * 16384 + vn1 * 16 + d2
-    print "%s --> %s : %s" %(node1, node2, vn)
-    return vn
-
 u_dict={}
 """
 This function takes in a switch name, in the format 'sw#', ex: 'sw1' and runs several
 ovs-vsctl commands. It starts off by adding our bridge, then sets up a controller address which the
 switch connects to (if it was specified as none inside the topology.py file, we do not implement this).
 
-The two for loops inside this function establish a vxlan configuration for every node this switch connects to.
-The first for loop takes care of the connections found inside the topology[sw#] = '.... establishes everything here....'
-and the second for loop establishes the connections to that switch found in another switch's dictionary values.
+The for loop inside this function establishes a vxlan configuration for every node this switch connects to,
+both the connections found inside the topology[sw#] = '.... establishes everything here....'
+and the connections to that switch found in another switch's dictionary values.
 
 Example:
 topology['sw1'] = [('h1', '192.168.200.10'),'sw3']
 topology['sw2'] = ['sw1']
 topology['sw3'] = [('h2', '192.168.200.11')]
 
-The first for loop establishes the vxlands for h1 and sw3 and the second for loop
-establishes the connection to sw2
+For sw1 the loop establishes the vxlans for h1, sw3 and sw2
 """
-def setupSwitch(switch):
+def setupSwitch(switch, links=None, base=True):
         print "working on switch: %s\n" %switch
-        fixed_ip= fxdict[switch]
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(fixed_ip, username=u_dict.get(switch, vm_user_name), key_filename=private_key_file, timeout=20)
-        time.sleep(3)
         # running the ovs commands
         if switch not in nodes:
             print "Switch %s was not defined in 'nodes', setting up using default ovs commands" % switch
         bridge_name = 'br1'
         if 'bridge_name' in nodes[switch]:
             bridge_name = nodes[switch]['bridge_name']
-        #ssh.exec_command("sudo ovs-vsctl del-br %s" % bridge_name)
-        #time.sleep(1)
-        ssh.exec_command("sudo ovs-vsctl -- --may-exist add-br %s" % bridge_name)
-        time.sleep(1)
-        contrl_adr = nodes[switch].get('contr_addr', contr_addr)
-        if len(contrl_adr) > 0:
-            ssh.exec_command("sudo ovs-vsctl set-controller %s tcp:%s" % (bridge_name, contrl_adr))
-            time.sleep(1)
-            ssh.exec_command("sudo ovs-vsctl set-fail-mode %s secure" % bridge_name)
-            time.sleep(1)
-            ssh.exec_command("sudo ovs-vsctl set controller %s connection-mode=out-of-band"% bridge_name)
-            time.sleep(1) 
-        else:
-            ssh.exec_command("sudo ovs-vsctl del-controller %s" % (bridge_name))
-            time.sleep(1)
-            ssh.exec_command("sudo ovs-vsctl del-fail-mode %s" % bridge_name)
-        if 'int_ip' in nodes[switch]:
-            int_ip_name = nodes[switch]['int_ip'][0]
-            int_ip = nodes[switch]['int_ip'][1]
-            ssh.exec_command("sudo ovs-vsctl -- --may-exist add-port %s %s -- set interface %s type=internal " % (bridge_name,int_ip_name, int_ip_name))
-            time.sleep(1)     
-            ssh.exec_command("mac=`sudo ovs-vsctl get interface %s mac_in_use`;sudo ovs-vsctl set interface %s mac=\"$mac\"" % (int_ip_name,int_ip_name));
-            ssh.exec_command("sudo ifconfig %s %s/24 up" %(int_ip_name, int_ip))
-            time.sleep(1) 
-        # this will hold the internal ip for use in the vxlan set up
-        connectip = ''
-        # this is used for the vxlan count and VLNI number (this must be the same on both sides)
-        vlni = 0
-        # used to implement a different VLNI number. For the cases of multiple connections to the same node
-        vnlilist = []
-        # this 'host' is every node consisting of triplette or switch name for that switch
-        for host in topology[switch]:
-            # handle hosts 
-            if isinstance(host, tuple):
-                #vlni = int(host[0][1]) + int(switch[2]) + (2*numSwitches) + 10
-                vlni = _get_vni(host[0], switch)
-                #vlni += vnlilist.count(vlni)
-                #vnlilist.append(vlni)
-                connectip = fxdict[host[0]]
-            # handle switches
-            else: 
-                #vlni = int(host[2]) + int(switch[2]) + 10
-                vlni = _get_vni(host, switch)
-                #vlni += vnlilist.count(vlni)
-                #vnlilist.append(vlni)
-                connectip = fxdict[host]
-            #ssh.exec_command("sudo ovs-vsctl add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s ofport_request=%s" % (bridge_name,vlni,vlni,connectip,vlni,vlni))
-            ssh.exec_command("sudo ovs-vsctl -- --may-exist add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name,vlni,vlni,connectip,vlni))
-            time.sleep(1)
-        # establishes all the other connections to this switch 
-        for keys in topology.keys():
-            for host in topology[keys]:
-                if (host == switch):
-                    connectip = fxdict[keys]
-                    #vlni = int(keys[2]) + int(switch[2]) + 10 
-                    #vlni += vnlilist.count(vlni)
-                    #vnlilist.append(vlni)
-                    vlni = _get_vni(keys, switch)
-                    ssh.exec_command("sudo ovs-vsctl -- --may-exist add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name, vlni, vlni,connectip, vlni))
-                    time.sleep(1)
-        ssh.close()
+        # the whole switch configuration is collected and applied as one ovs-vsctl transaction
+        txn = Transaction()
+        if base:
+            txn.add_bridge(bridge_name)
+            contrl_adr = nodes[switch].get('contr_addr', contr_addr)
+            if len(contrl_adr) > 0:
+                txn.set_controller(bridge_name, contrl_adr)
+            else:
+                txn.del_controller(bridge_name)
+            if 'int_ip' in nodes[switch]:
+                int_ip_name = nodes[switch]['int_ip'][0]
+                int_ip = nodes[switch]['int_ip'][1]
+                txn.add_internal_port(bridge_name, int_ip_name, int_ip)
+        # stale vxlan ports are only deleted when the whole switch is configured
+        prune = base and links is None
+        if links is None:
+            links = graph.links_of(switch)
+        # one vxlan port for every link of this switch, whichever side of the topology lists it
+        for link in links:
+            peer = link.other(switch)
+            # the VLNI number of the link (the same on both sides)
+            vlni = link.vni
+            txn.add_vxlan_port(bridge_name, vlni, fxdict[peer])
+        ovs.configure(sessions, switch, txn, prune=prune)
 
 """
 This function takes in a host name, in the format 'h#', ex: 'h1' and runs several
 ovs-vsctl commands. It starts off by adding a bridge and internal port for every connection
 to/from this host. The internal IP can be set to none, in this case we do not implement it
 
-The for loop inside this function performs the exact same as the 2nd for loop inside setupSwitches
+The links of the host are taken from the topology graph, in the order they appear in 'topology'
 """
-def setupHosts(host):
+def setupHosts(host, links=None):
         print "working on host: %s\n" %host
-        fixed_ip= fxdict[host]
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(fixed_ip, username=u_dict.get(host, vm_user_name), key_filename=private_key_file)
-        time.sleep(3)
         # running the ovs commands
-        count = 0
-        connectip = ''
-        vlni = 0
-        vnlilist = []
-        for keys in topology.keys():
-            # this 'hosts' is every node consisting of triplette or switch name for that switch
-            for hosts in topology[keys]:
-                # if true, this is a triplette belonging to this desired host
-                if (hosts[0] == host):
-                    # third element is the bridge name
-                    try:
-                        if hosts[2]:
-                            bridge_name = hosts[2]
-                    except:
-                        bridge_name = 'br%s' % count
-                    #ssh.exec_command("sudo ovs-vsctl del-br %s" % bridge_name)
-                    #time.sleep(1)
-                    ssh.exec_command("sudo ovs-vsctl -- --may-exist add-br %s" % bridge_name)
-                    time.sleep(1)
-                    ssh.exec_command("sudo ovs-vsctl -- --may-exist add-port %s p%s -- set interface p%s type=internal" % (bridge_name,count, count))
-                    time.sleep(1)
-                    ssh.exec_command("mac=`sudo ovs-vsctl get interface p%s mac_in_use`;sudo ovs-vsctl set interface p%s mac=\"$mac\"" % (count, count));
-                    if (hosts[1] != "None" or hosts[1] != "none"):
-                        ssh.exec_command("sudo ifconfig p%s %s/24 up" %(count, hosts[1]))
-                        time.sleep(1)
-                    connectip = fxdict[keys]
-                    #vlni = int(keys[2]) + int(host[1]) + (2*numSwitches) + 10
-                    #vlni += vnlilist.count(vlni)
-                    #vnlilist.append(vlni)
-                    vlni = _get_vni(keys, host)
-                    ssh.exec_command("sudo ovs-vsctl -- --may-exist add-port %s vxlan%s -- set interface vxlan%s type=vxlan options:remote_ip=%s options:key=%s" % (bridge_name,vlni,vlni,connectip,vlni))
-                    time.sleep(1)
-                    count += 1
-        ssh.close()
+        # the bridges and ports of every link are applied as one ovs-vsctl transaction
+        txn = Transaction()
+        prune = links is None
+        if links is None:
+            links = graph.links_of(host)
+        if not links:
+            return
+        # every link of a host has its own bridge and internal port
+        for link in links:
+            txn.add_bridge(link.bridge)
+            txn.add_internal_port(link.bridge, link.port, link.ip)
+            vlni = link.vni
+            txn.add_vxlan_port(link.bridge, vlni, fxdict[link.owner])
+        ovs.configure(sessions, host, txn, prune=prune)
+
+"""
+Configures a single node, switch or host. The nodes are independent of each other
+so this is what the worker pool runs for every node in the topology.
+In pipelined mode only the given links are set up, and base=False leaves out the
+switch's own bridge and controller, which were set up before.
+"""
+def setupNode(node, links=None, base=True):
+        with tracing.span('setup', node, links=len(links) if links is not None else 'all'):
+            if graph.is_switch(node):
+                setupSwitch(node, links, base)
+            else:
+                setupHosts(node, links)
+
+"""
+Called by the status polling as soon as a VM is done booting. In pipelined mode the
+node's internal ip is recorded right away and the node is handed to the pipeline,
+which configures it as soon as it accepts ssh connections.
+"""
+def serverDone(server):
+        if server.status != "ACTIVE":
+            return
+        for key in vmdict:
+            if vmdict[key] == server.id:
+                fxdict[key] = server.networks.values()[0][0]
+                sessions.register(key, fxdict[key], u_dict.get(key, vm_user_name))
+                stream.address_known(key)
+
+"""
+Waits until a node that is still booting passes its readiness probes (see readiness.py)
+and accepts ssh connections, so that the pipeline can configure it.
+"""
+def nodeReady(node):
+        server = server_of.get(vmdict[node])
+        # a node taken from the manifest has no server object, it was up before
+        if server is not None:
+            readiness.wait_ready(sanity.Node(node, server, fxdict[node], sessions))
+        sessions.wait(node)
+
+"""
+Sanity test of one node: readiness probes, ping, ssh and internet access, see sanity.py.
+The nodes are independent of each other, so several of them are checked at a time.
+"""
+def sanityCheck(node):
+        server = server_of[vmdict[node]]
+        return sanity.run_checks(sanity.Node(node, server, fxdict[node], sessions))
 
 
 print "\n\n"
@@ -347,6 +264,8 @@ print "\n"
 # holds the internal ips for each VM... key = node name, value = internal ip
 fxdict= {}
 vmdict= {}
+# quantum port id of every node
+port_ids= {}
 i_name_dict={}
 # backup of the default parameters as specified inside the config.py file
 fixedRegion_name = region_name
@@ -360,10 +279,12 @@ if True:
         try:
             # this list holds the servers (vms)
             servers_list=[]
+            # the region of every server, for the status polling
+            tracked = []
             # this list holds each node's pretty table object
             table_list = []
-            finished_servers = []
             # launch all of the VMs without checking the active state
+            tracing.phase('discovery')
             for i in range(numNodes): 
                 """
                 Parse the 'nodes' dictionary as defined in the topology.py file
@@ -405,14 +326,26 @@ if True:
                     flavor_name = fixedflavor_name
                     image_name = fixedimage_name
                     instance_name = fixedInstancename + "%s" % (nodeName)
-                                    
-                c=nclient.Client(user, password, tenant_name, auth_url, region_name=region_name, no_cache=True)
+
+                # a node recorded in the manifest is used as it is, without asking the cloud
+                entry = manifest.usable(nodeName, instance_name, region_name)
+                if entry is not None:
+                    print_msg("\nUsing VM %s of %s from %s" % (instance_name, nodeName, manifest.path))
+                    vmdict[nodeName] = entry['vm_id']
+                    fxdict[nodeName] = entry['fixed_ip']
+                    u_dict[nodeName] = entry.get('user', u_name)
+                    if 'port_id' in entry:
+                        port_ids[nodeName] = entry['port_id']
+                    sessions.register(nodeName, fxdict[nodeName], u_dict[nodeName])
+                    continue
+
+                c=clients.nova(region_name)
                 #instance_name = fixedInstancename + "%s" % (nodeName)
                 i_name_dict[instance_name]=nodeName
                 print_msg("\nTesting VM %d/%d (%s / %s) on region: %s" % (i+1, numNodes, nodeName, instance_name, region_name))
 
                 #create quantum client for floating ip address creation/association and VM network
-                quantum=qclient.Client(username=user, password=password, tenant_name=tenant_name, auth_url=auth_url, region_name=region_name)
+                quantum=clients.quantum(region_name)
                 #look for network id of the external network
                 _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', tenant_name+'-net')
                 v_nics=[]
@@ -428,76 +361,80 @@ if True:
                 v_nics.append(v_nic)
                 #print s1
 
-                servers=c.servers.list()
-                s1=None
-                for server in servers:
-                    if server.name == instance_name:
-                        s1 = server
-                        print "found\n"
-                        break
-                if s1 is None or s1.name != instance_name:
+                s1=server_index.find(region_name, instance_name)
+                if s1 is None:
                     print "cant find this server: %s\n" %instance_name
                     sys.exit(0)
+                print "found\n"
                 x.add_row(["VM ID",s1.id])
                 # note, here we do not have the internal ips. So we specify the server id with that node's name
                 vmdict["%s" % (nodeName)] = s1.id
+                tracing.alias(instance_name, nodeName)
                 u_dict[nodeName]=u_name
+                manifest.record(nodeName, vm_id=s1.id, name=instance_name, region=region_name, user=u_name)
                 servers_list.append(s1)
                 table_list.append(x)
+                tracked.append((region_name, s1))
             
-            # Wait until every VM has booted up. Checks the active/error state of the VMs
-            fixed_ip = None
-            srv_cnt = 0
-            for i in range (1, 50):
-                srv_cnt = 0
-                for s1 in servers_list:
-                    s1.get()
-                    if s1.status == "ERROR":
-                        srv_cnt += 1
-                        if s1.id in finished_servers:
-                           continue;
-                        finished_servers.append(s1.id)
-                        print_msg("server is in error")
-                    elif s1.status == "ACTIVE":
-                        srv_cnt += 1
-                        if s1.id in finished_servers:
-                           continue;
-                        finished_servers.append(s1.id)
-                        (s_net, s_ip)=s1.networks.popitem()
-                        if fixed_ip is None:
-                            fixed_ip = s_ip[0]
-                if srv_cnt >= len(servers_list):
-                    print_msg("All servers are done")
-                    break    
-                print_msg("server count is %s/%s " % (srv_cnt, numNodes))
-                time.sleep(2)
+            # Wait until every VM has booted up, reading the state of all of them with one call per region
+            server_of = dict((s1.id, s1) for s1 in servers_list)
+            waiter = cloud.ServerWaiter(clients, fixedInstancename)
+            tracing.phase(pipelined_setup and 'boot and setup' or 'wait-active')
+            if pipelined_setup:
+                # set up every node and link while the other VMs are still booting
+                stream = Pipeline(graph, setupNode, ready=nodeReady, ready_workers=readiness.readiness_workers)
+                # the nodes taken from the manifest already have their address
+                for node in fxdict.keys():
+                    stream.address_known(node)
+                waiter.wait(tracked, on_done=serverDone)
+                results = stream.join()
+                print_results(results, "Overlay configuration")
+                for node, link in stream.unfinished():
+                    print "link %s -> %s was not set up on %s, run SetupTopology.py once the VMs are ready" % (node, link.other(node), node)
+            else:
+                waiter.wait(tracked)
 
             # This forloop updates our 'fxdict' dict and matches the internal ips with that node name
             tempcount = 0
             for s1 in servers_list:
-                s1.get()
                 if s1.status == "ACTIVE":
                    (s_net, s_ip)=s1.networks.popitem()
                    # add in the internal ip for that node 
                    for key in vmdict:
                         if (vmdict[key] == s1.id):
                             fxdict[key] = s_ip[0]            
+                            manifest.record(key, fixed_ip=s_ip[0])
+                            sessions.register(key, s_ip[0], u_dict.get(key, vm_user_name))
                    checkServer(s1)                       #-----------------------------
                    table_list[tempcount].add_row(["Host",str(getattr(s1, "OS-EXT-SRV-ATTR:host"))])
                    table_list[tempcount].add_row(["Instance Name",str(getattr(s1, "OS-EXT-SRV-ATTR:instance_name"))])
                    table_list[tempcount].add_row(["Interal IP addr", s_ip[0]])
                    tempcount += 1
 
-            # get a list of port id in quantum
-            ports=quantum.list_ports()
-
-            #look for the port is of the server port
-            for port in ports['ports']:
-                    ips=port['fixed_ips']
-                    for ip in ips:
-                        if ip['ip_address'] == fixed_ip:
-                                pid=port['id']
-                                break
+            # the hosts the VMs ended up on, compared with the planned ones
+            if placement_plan:
+                hosts_of = {}
+                for key in vmdict:
+                    s1 = server_of.get(vmdict[key])
+                    if s1 is None or s1.status != "ACTIVE":
+                        continue
+                    if key in placement_plan and not check_host(s1, placement_plan[key]):
+                        print_msg("%s was not put on its planned host %s" % (key, placement_plan[key]))
+                    hosts_of[key] = getattr(s1, "OS-EXT-SRV-ATTR:host", None)
+                placement.print_check(graph, placement_plan, hosts_of)
+
+            # the quantum port of every node, from queries filtered on the VM ids
+            tracing.phase('ports')
+            port_index = cloud.PortIndex(clients)
+            port_index.load(tracked)
+            for tempcount, s1 in enumerate(servers_list):
+                for key in vmdict:
+                    if vmdict[key] == s1.id and port_index.by_device(s1.id):
+                        port_ids[key] = port_index.by_device(s1.id)[0]['id']
+                        manifest.record(key, port_id=port_ids[key])
+                        table_list[tempcount].add_row(["Port ID", port_ids[key]])
+            manifest.record_links(graph, nodes)
+            manifest.save()
 
             # loop over and print out the tables. They are in the pretty table format
             tempcount = 0
@@ -506,93 +443,23 @@ if True:
                 print "\n"
                 tempcount += 1
 
-            #look for network id of the external network
-            _network_id = quantumv20.find_resourceid_by_name_or_id(quantum, 'network', 'ext_net')
-
             print fxdict
-            wait_before_ssh=3
-            for s1 in servers_list:
-                print s1
-                #s1 = servers_list[-1]
-                #fixed_ip = fxdict.values()[-1]
-                fixed_ip = fxdict[i_name_dict[s1.name]]
-                print_msg("waiting %d seconds before ssh test" %wait_before_ssh)
-                time.sleep(wait_before_ssh)
-
-                try:
-                    for i in range (1, 5):
-                        s1.get()
-                        server_console_output = s1.get_console_output()
-                        if s1.status == "ACTIVE" and ("Generation complete." not in server_console_output):
-                            if fixed_ip not in s1.get_console_output():
-                                print_msg("failed to get dhcp address %s \n" % fixed_ip)
-                            if "waiting 120 seconds for a network device" in server_console_output:
-                                print_msg("strange!: waiting 120 seconds for a network device")
-                            #print_msg("Please be patient, waiting another %d seconds \n" % wait_before_ssh)
-                            break
-                        elif s1.status == "ACTIVE":
-                            print_msg("Server console-log is fine: %s, %s, %s \n" %(s1.id, s1.name, fixed_ip))
-                            if fixed_ip not in s1.get_console_output():
-                            #shouldnt get here if key genration comepleted fine
-                                print_msg("failed to get dhcp address %s \n" % fixed_ip)
-                            break
-                        time.sleep(wait_before_ssh)
-                except:
-                    msg = msg + "\n exception in console-log check\n"
-                    pass
-
-                #ping fixed ip and print output
-                if fixed_ip is not None:
-                    str2="ping to fixedip %s failed " % fixed_ip 
-                    try:
-                        str1=subprocess.check_output(['ping', '-c 3', fixed_ip])
-                    except:
-                        pass
-                    try:
-                        str1=subprocess.check_output(['ping', '-c 3', fixed_ip])
-                        str2=str1
-                    except:
-                        pass
-                    print_msg(str2)
-
-                    #ssh to the server and execute a couple of commands for sanity test
-                    print_msg("starting ssh test")
-                    out1 = ""
-                    out2 = ""
-                    try:
-                        ssh = paramiko.SSHClient()
-                        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                        ssh.connect(fixed_ip, username=u_dict.get(i_name_dict[s1.name], vm_user_name), key_filename=private_key_file)
-                        time.sleep(1)
-    
-                        stdin, stdout, stderr = ssh.exec_command("uptime")
-                        stdin.close()
-                        out1=stdout.readlines()
-                        print_msg("uptime output is: %s" % (''.join(out1)))
-                        time.sleep(1)
-    
-                        stdin, stdout, stderr = ssh.exec_command("ping -c2 www.google.ca")
-                        stdin.close()
-                        out2=stdout.readlines()
-                        print_msg("ping output is: %s" % (''.join(out2)))
-                        ssh.close() 
-                        # running the ovs commands
-                    except:
-                        print_msg("Ssh failed. If the edge is overloaded, allocate more time before the SSH check")
+            # sanity test of every node that was looked up in the cloud, sanity_workers nodes at a time
+            tracing.phase('sanity')
+            results = run_parallel(sanityCheck, [node for node in nodeList if node in fxdict and vmdict.get(node) in server_of], workers=sanity.sanity_workers)
+            sanity.print_summary(results, "Sanity checks")
     
             print "\nPlease wait roughly %s seconds as the VxLans are being set up\n" % (numNodes*30)
                         
-            # set up the controllers
-            # the value "switch" being passed in is in the form of 'sw#'
-            for switch in topology.keys():
-                setupSwitch(switch) 
-                        
-            # set up the hosts
-            # the value "host" being passed in is in the form of 'h#'
-            for host in hostList:
-                setupHosts(host)    
+            # set up the switches ('sw#') and the hosts ('h#'), max_workers nodes at a time
+            if not pipelined_setup:
+                tracing.phase('setup')
+                results = run_parallel(setupNode, topology.keys() + hostList)
+                print_results(results, "Overlay configuration")
 
+            tracing.finish("Timing")
             print "All Finished, you can now access your VMs \n\n"
+            sessions.close()
                         
         except:
             print "Failed to launch VMs. Check your keystone credentials"
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+benchmark.py
+===============
+Runs the launch and setup scripts on generated topologies against the
+simulated testbed of simulate.py, and reports for every run the wall time,
+the Nova/Quantum/Keystone calls, the ssh connections and remote commands,
+and how many vxlan ports ended up configured.
+
+Usage: benchmark.py [--latency=S] [--ssh-latency=S] [--boot-time=S]
+                    [--error-rate=F] [--drop-rate=F] [--workers=N]
+                    [--pipelined] [--verbose] [size ...]
+
+Every size (10, 100 and 1000 nodes by default) is a leaf-spine topology
+with one host per leaf. For each size three scenarios are run:
+
+    launch      SDNLauncher
+    two-step    SetupNodes.py, then SetupTopology.py
+    rerun       SetupTopology.py and GetInfomrtaion.py again on the
+                deployment of two-step
+
+The scripts run in this process with a config.py and a topology.py made up
+here; the real config.py and topology.py are not read.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+TENANT = 'bench'
+SEC_GROUP = 'bench-sec'
+
+
+def parse_args(argv):
+    options = {'latency': 0.0, 'ssh-latency': 0.0, 'boot-time': 0.0, 'error-rate': 0.0,
+               'drop-rate': 0.0, 'workers': 10, 'pipelined': False, 'verbose': False}
+    sizes = []
+    for arg in argv:
+        if arg.startswith('--'):
+            name, _, value = arg[2:].partition('=')
+            if name not in options:
+                raise SystemExit("unknown option %s\n%s" % (arg, __doc__))
+            if isinstance(options[name], bool):
+                options[name] = True
+            else:
+                options[name] = type(options[name])(value)
+        else:
+            sizes.append(int(arg))
+    return options, sizes or [10, 100, 1000]
+
+
+def make_config(options, workdir):
+    """A config module for the scripts, installed before any of them is imported"""
+    config = types.ModuleType('config')
+    key_file = os.path.join(workdir, 'key')
+    with open(key_file, 'w') as f:
+        f.write('not a real key\n')
+    values = {
+        'user': 'bench', 'password': 'bench', 'tenant_name': TENANT,
+        'auth_url': 'http://keystone.invalid:5000/v2.0', 'region_name': 'CORE',
+        'instance_name': 'bench-', 'key_name': 'bench', 'private_key_file': key_file,
+        'pub_key': '', 'image_name': 'ubuntu', 'flavor_name': 'm1.tiny',
+        'sec_group_name': SEC_GROUP, 'vm_user_name': 'ubuntu',
+        'max_workers': options['workers'], 'pipelined_setup': options['pipelined'],
+        # the tcp probe would connect to the fake addresses for real
+        'readiness_probes': ['console'],
+        'token_cache_file': '',
+        'manifest_file': os.path.join(workdir, 'deployment.json'),
+        'hostmap_file': os.path.join(workdir, 'hosts.json'),
+        'trace_file': os.path.join(workdir, 'trace.json'),
+        # room for the hosts of the largest topologies
+        'int_prefix_len': 16,
+    }
+    for name, value in values.items():
+        setattr(config, name, value)
+    return config
+
+
+def make_topology(size):
+    """A leaf-spine topology of about 'size' nodes, as a topology module"""
+    import topogen
+    # one host per leaf, a spine for every 16 leaves
+    leaves = max(1, (size * 16) // 33)
+    spines = max(1, size - 2 * leaves)
+    module = types.ModuleType('topology')
+    module.contr_addr = '10.0.0.1:6633'
+    module.topology, module.nodes = topogen.build(topogen.leaf_spine(spines, leaves),
+                                                  switch={'contr_addr': module.contr_addr})
+    return module
+
+
+class Run(object):
+    """Counters of one scenario"""
+
+    def __init__(self, size, scenario):
+        self.size = size
+        self.scenario = scenario
+        self.elapsed = 0.0
+        self.calls = {}
+        self.error = None
+        self.vxlan_ports = 0
+        self.expected_ports = 0
+
+    def count(self, prefix):
+        return sum(n for name, n in self.calls.items() if name.startswith(prefix))
+
+
+def run_script(name):
+    """Run one of the scripts as __main__, with its output thrown away"""
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        runpy.run_path(os.path.join(SCRIPTS, name), run_name='__main__')
+    except SystemExit, e:
+        if e.code not in (None, 0):
+            raise
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def run_scenario(fake, size, scenario, scripts, expected):
+    import remote
+    import tracing
+    run = Run(size, scenario)
+    before = dict(fake.calls)
+    start = time.time()
+    try:
+        for name in scripts:
+            remote.history.clear()
+            tracing.tracer.reset()
+            run_script(name)
+    except Exception, e:
+        run.error = "%s: %s" % (e.__class__.__name__, e)
+    run.elapsed = time.time() - start
+    for name, n in fake.calls.items():
+        if n - before.get(name, 0):
+            run.calls[name] = n - before.get(name, 0)
+    run.vxlan_ports = fake.vxlan_ports()
+    run.expected_ports = expected
+    return run
+
+
+def benchmark(options, size, workdir):
+    import simulate
+    import graph
+    topology = make_topology(size)
+    sys.modules['topology'] = topology
+    expected = 2 * len([l for l in graph.Graph(topology.topology).links])
+    runs = []
+    for scenario, scripts in [('launch', ['SDNLauncher']),
+                              ('two-step', ['SetupNodes.py', 'SetupTopology.py']),
+                              ('rerun', ['SetupTopology.py', 'GetInfomrtaion.py'])]:
+        if scenario != 'rerun':
+            # a new cloud and no record of an earlier deployment
+            for name in ('deployment.json', 'hosts.json'):
+                if os.path.exists(os.path.join(workdir, name)):
+                    os.remove(os.path.join(workdir, name))
+            fake = simulate.FakeCloud(latency=options['latency'], ssh_latency=options['ssh-latency'],
+                                      boot_time=options['boot-time'], error_rate=options['error-rate'],
+                                      drop_rate=options['drop-rate'], networks=[TENANT + '-net', 'ext_net'],
+                                      groups=[SEC_GROUP], seed=size)
+            fake.install()
+        try:
+            runs.append(run_scenario(fake, size, scenario, scripts, expected))
+        finally:
+            if scenario != 'two-step':
+                fake.uninstall()
+    return runs
+
+
+def print_report(runs, verbose=False):
+    from prettytable import PrettyTable
+    x = PrettyTable(["Nodes", "Scenario", "Time (s)", "API calls", "Server lists",
+                     "SSH connects", "SSH commands", "Vxlan ports", "Error"])
+    for run in runs:
+        x.add_row([run.size, run.scenario, "%.2f" % run.elapsed,
+                   run.count('nova.') + run.count('quantum.') + run.count('keystone.'),
+                   run.calls.get('nova.servers.list', 0), run.calls.get('ssh.connect', 0),
+                   run.calls.get('ssh.command', 0), "%d/%d" % (run.vxlan_ports, run.expected_ports),
+                   run.error or ''])
+    print x
+    if verbose:
+        for run in runs:
+            print "\n%s nodes, %s:" % (run.size, run.scenario)
+            for name in sorted(run.calls):
+                print "  %-40s %d" % (name, run.calls[name])
+
+
+def main(argv):
+    options, sizes = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='sdnlauncher-bench-')
+    sys.modules['config'] = make_config(options, workdir)
+    sys.path.insert(0, SCRIPTS)
+    runs = []
+    try:
+        for size in sizes:
+            runs.extend(benchmark(options, size, workdir))
+    finally:
+        shutil.rmtree(workdir)
+    print_report(runs, options['verbose'])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
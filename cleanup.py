@@ -27,64 +27,110 @@ from quantumclient.v2_0 import client as qclient
 import smtplib
 from quantumclient.quantum import v2_0 as quantumv20
 from novaclient import exceptions
-from keystoneclient.v2_0 import client as ksclient
-import re
 
 
-from topology import topology, nodes
+import cloud
+import placement
+from parallel import run_parallel, print_results
+from manifest import Manifest
 from config import region_name
 from config import user, password, auth_url, instance_name, tenant_name
 
-if len(sys.argv) > 1:
-    instance_name = sys.argv[1] 
-
-valuelist = []
-for values in topology.values():
-    for tuples in values:
-        # we only want the hosts
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in valuelist):
-                valuelist.append(tuples[0])
-
-numHosts = len(valuelist)
-numSwitches = len(topology.keys())
-numNodes = numHosts + numSwitches
-
-# this list contains the switch names and host names
-nodeList = []
-# start off by appending the switche names
-for key in topology.keys():
-    if (key not in nodeList):
-        nodeList.append(key)
-
-# this list only holds the host names (used to append into the nodeList)
-hostList = []
-for values in topology.values():
-    for tuples in values:
-        if isinstance(tuples, tuple):
-            if ((tuples[0][0] == 'h' or tuples[0][0] == 'H') and tuples[0] not in hostList):
-                hostList.append(tuples[0])
-
-hostList.sort()
-for elem in hostList:
-    nodeList.append(elem)
-
-
-regionlist = []
-regionlist.append(region_name)
-for values in nodes.values():
-    if 'region' in values:
-        if values['region'] not in regionlist:
-            regionlist.append(values['region'])
-
-names=[]
-for node in nodeList:
-    names.append(nodes[node].get('name', "%s%s" %(instance_name, node)))
-
-for region_name in regionlist:
-        c2=nclient.Client(user, password, tenant_name, auth_url, region_name=region_name, no_cache=True)
-        servers=c2.servers.list()
-        for server in servers:
-            if server.name in names:
-                print "Deleting VM %s " % server.name
-                server.delete() 
+"""
+Usage: cleanup.py [--manifest] [VM_prefix]
+
+Deletes the VMs of the topology in topology.py, looking for them in every region
+of the topology. With --manifest the VMs recorded in 'manifest_file' are deleted
+instead, and topology.py is not needed.
+"""
+args = sys.argv[1:]
+from_manifest = '--manifest' in args
+args = [arg for arg in args if arg != '--manifest']
+if len(args) > 0:
+    instance_name = args[0]
+
+manifest = Manifest()
+recorded = manifest.load()
+
+# region -> [(VM name, VM id or None for any VM with that name, node)]
+targets = {}
+if from_manifest:
+    if not manifest.nodes:
+        print "nothing recorded in %s" % manifest.path
+        sys.exit(1)
+    for node, entry in sorted(manifest.nodes.items()):
+        if entry.get('name') and entry.get('region'):
+            targets.setdefault(entry['region'], []).append((entry['name'], entry.get('vm_id'), node))
+else:
+    from topology import topology, nodes
+    from graph import Graph
+
+    graph = Graph(topology)
+    nodeList = graph.node_list()
+
+    regionlist = []
+    regionlist.append(region_name)
+    for values in nodes.values():
+        if 'region' in values:
+            if values['region'] not in regionlist:
+                regionlist.append(values['region'])
+    # the regions the launch may have picked for the other nodes
+    if placement.region_assignment:
+        for pair in sorted(placement.region_latency):
+            for region in pair:
+                if region not in regionlist:
+                    regionlist.append(region)
+
+    names = {}
+    for node in nodeList:
+        names[nodes.get(node, {}).get('name', "%s%s" %(instance_name, node))] = node
+    for region in regionlist:
+        targets[region] = [(name, None, node) for name, node in sorted(names.items())]
+
+clients = cloud.ClientFactory(user, password, tenant_name, auth_url)
+# the servers of every region are listed once, filtered on the prefix by nova
+server_index = cloud.ServerIndex(clients, instance_name)
+
+"""
+Deletes the VMs of one region; the regions are handled at the same time.
+Returns the (region, server, node) of every VM it deleted.
+"""
+def deleteRegion(region):
+        deleted = []
+        for name, vm_id, node in targets[region]:
+            for server in server_index.find_all(region, name):
+                if vm_id is not None and server.id != vm_id:
+                    continue
+                print "Deleting VM %s in %s" % (server.name, region)
+                try:
+                    server.delete()
+                except exceptions.NotFound:
+                    continue
+                deleted.append((region, server, node))
+        return deleted
+
+results = run_parallel(deleteRegion, sorted(targets))
+print_results(results, "VM deletion")
+deleted = []
+for result in results:
+    if result.ok:
+        deleted.extend(result.value)
+
+# wait until the servers are really gone, so that their quota is free again
+waiter = cloud.ServerWaiter(clients, instance_name)
+leftovers = waiter.wait_deleted([(region, server) for region, server, node in deleted])
+left_ids = set(server.id for region, server in leftovers)
+
+for region, server, node in deleted:
+    entry = manifest.get(node)
+    if server.id not in left_ids and entry is not None and entry.get('vm_id') == server.id:
+        manifest.forget(node)
+if recorded:
+    manifest.save()
+
+print "%d VMs deleted" % (len(deleted) - len(leftovers))
+if leftovers:
+    print "These VMs are still there:"
+    for region, server in leftovers:
+        print "  %s (%s) in %s, status %s" % (server.name, server.id, region, server.status)
+    sys.exit(1)
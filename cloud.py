@@ -0,0 +1,522 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+cloud.py
+===============
+Nova and Quantum clients for the SAVI testbed.
+
+ClientFactory authenticates against Keystone once per tenant and hands out
+clients for any region that reuse the token and the endpoints of the service
+catalog, instead of every client doing its own authentication. The token is
+renewed when it is about to expire and, when token_cache_file is set in
+config.py, kept on disk so that SetupNodes.py, GetInfomrtaion.py and
+SetupTopology.py run one after the other authenticate only once.
+
+ServerIndex lists the servers of a region once, keeping only those whose
+name starts with the instance prefix when Nova can filter on it, and finds
+the server of every node by name in that listing.
+
+SecurityGroupSync makes sure the security group of the VMs has the rules the
+overlay needs, reading the group once per region and creating only the rules
+it is missing.
+
+PortIndex finds the Quantum ports of the VMs with a query filtered on their
+device ids, one per region, instead of listing every port of the tenant.
+
+ServerWaiter waits for a set of servers to finish booting, or to be gone
+after they were deleted, with one detailed list call per region on every
+pass instead of a GET per server.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+import novaclient.v1_1.client as nclient
+from quantumclient.v2_0 import client as qclient
+from keystoneclient.v2_0 import client as ksclient
+import novaclient.v1_1.shell as nshell
+from novaclient import exceptions
+
+import tracing
+
+try:
+    from config import token_cache_file
+except ImportError:
+    token_cache_file = ''
+
+try:
+    from config import boot_timeout
+except ImportError:
+    boot_timeout = 300
+
+try:
+    from config import delete_timeout
+except ImportError:
+    delete_timeout = 300
+
+# renew the token when it expires within this many seconds
+TOKEN_MARGIN = 300
+
+# rules the VMs need: ssh, vxlan and ping from inside the testbed
+# (protocol, from port, to port, source)
+SECURITY_RULES = [
+    ("TCP", 22, 22, "10.0.0.0/8"),
+    ("UDP", 4789, 4789, "10.0.0.0/8"),
+    ("ICMP", -1, 255, "10.0.0.0/8"),
+]
+
+
+# three functions needed for whale client connection
+def _strip_version(endpoint):
+        """Strip a version from the last component of an endpoint if present"""
+
+        # Get rid of trailing '/' if present
+        if endpoint.endswith('/'):
+            endpoint = endpoint[:-1]
+        url_bits = endpoint.split('/')
+        # regex to match 'v1' or 'v2.0' etc
+        if re.match('v\d+\.?\d*', url_bits[-1]):
+            endpoint = '/'.join(url_bits[:-1])
+        return endpoint
+
+
+def _get_ksclient(**kwargs):
+        """Get an endpoint and auth token from Keystone.
+
+        :param username: name of user
+        :param password: user's password
+        :param tenant_id: unique identifier of tenant
+        :param tenant_name: name of tenant
+        :param auth_url: endpoint to authenticate against
+        """
+        return ksclient.Client(username=kwargs.get('username'),
+                               password=kwargs.get('password'),
+                               tenant_id=kwargs.get('tenant_id'),
+                               tenant_name=kwargs.get('tenant_name'),
+                               auth_url=kwargs.get('auth_url'),
+                               insecure=kwargs.get('insecure'))
+
+def _get_endpoint(client, **kwargs):
+        """Get an endpoint using the provided keystone client."""
+
+        service_type = kwargs.get('service_type') or 'configuration'
+        endpoint_type = kwargs.get('endpoint_type') or 'publicURL'
+        region = kwargs.get('region')
+        if region is not None:
+                endpoint = client.service_catalog.url_for(
+                             attr='region',
+                             filter_value=region,
+                             service_type=service_type,
+                             endpoint_type=endpoint_type)
+        else:
+                endpoint = client.service_catalog.url_for(
+                             service_type=service_type,
+                             endpoint_type=endpoint_type)
+
+        if kwargs.get('strip_version', True):
+            return _strip_version(endpoint)
+        return endpoint
+
+
+def _parse_expires(expires):
+    """Keystone expiry time, e.g. '2014-05-01T12:00:00Z', as a utc datetime"""
+    return datetime.datetime.strptime(expires[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+class Token(object):
+    """A Keystone token and the endpoints it was issued with"""
+
+    def __init__(self, token_id, expires, endpoints=None):
+        self.id = token_id
+        self.expires = expires
+        # region -> service type -> url
+        self.endpoints = endpoints or {}
+
+    def valid(self):
+        left = _parse_expires(self.expires) - datetime.datetime.utcnow()
+        return left > datetime.timedelta(seconds=TOKEN_MARGIN)
+
+    def to_dict(self):
+        return {'id': self.id, 'expires': self.expires, 'endpoints': self.endpoints}
+
+
+class ClientFactory(object):
+    """Nova and Quantum clients sharing one Keystone token per tenant"""
+
+    def __init__(self, username, password, tenant_name, auth_url, cache_file=None):
+        self.username = username
+        self.password = password
+        self.tenant_name = tenant_name
+        self.auth_url = auth_url
+        if cache_file is None:
+            cache_file = token_cache_file
+        self.cache_file = cache_file and os.path.expanduser(cache_file)
+        self.token = None
+        self.keystone = None
+        self.authentications = 0
+        self.lock = threading.RLock()
+
+    def _cache_key(self):
+        return "%s %s@%s" % (self.auth_url, self.username, self.tenant_name)
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file) as f:
+                entry = json.load(f).get(self._cache_key())
+        except (IOError, ValueError):
+            return None
+        if entry is None:
+            return None
+        token = Token(entry['id'], entry['expires'], entry.get('endpoints'))
+        if token.valid():
+            return token
+        return None
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        cache = {}
+        try:
+            with open(self.cache_file) as f:
+                cache = json.load(f)
+        except (IOError, ValueError):
+            pass
+        cache[self._cache_key()] = self.token.to_dict()
+        # the token gives access to the tenant, keep it private to the user
+        fd = os.open(self.cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+
+    def _authenticate(self):
+        with tracing.span('auth'):
+            self.keystone = _get_ksclient(username=self.username, password=self.password,
+                                          tenant_name=self.tenant_name, auth_url=self.auth_url)
+        self.authentications += 1
+        token = self.keystone.service_catalog.get_token()
+        self.token = Token(token['id'], token['expires'])
+        self._save()
+
+    def get_token(self):
+        """A valid token, from memory, from the cache file or from Keystone"""
+        with self.lock:
+            if self.token is None or not self.token.valid():
+                self.token = self._load()
+            if self.token is None:
+                self._authenticate()
+            return self.token
+
+    def endpoint(self, region, service_type):
+        """Public url of a service in a region, looked up once per token"""
+        with self.lock:
+            token = self.get_token()
+            urls = token.endpoints.setdefault(region, {})
+            if service_type not in urls:
+                if self.keystone is None:
+                    # the token came from the cache file but the region is new
+                    self._authenticate()
+                    token = self.token
+                    urls = token.endpoints.setdefault(region, {})
+                # quantumclient adds its own version to the url, nova needs it
+                urls[service_type] = _get_endpoint(self.keystone, service_type=service_type,
+                                                   region=region, strip_version=(service_type == 'network'))
+                self._save()
+            return token.id, urls[service_type]
+
+    def nova(self, region):
+        token_id, url = self.endpoint(region, 'compute')
+        return nclient.Client(self.username, self.password, self.tenant_name, self.auth_url,
+                              region_name=region, no_cache=True, auth_token=token_id, bypass_url=url)
+
+    def quantum(self, region):
+        token_id, url = self.endpoint(region, 'network')
+        return qclient.Client(username=self.username, password=self.password, tenant_name=self.tenant_name,
+                              auth_url=self.auth_url, region_name=region, token=token_id, endpoint_url=url)
+
+
+class ServerIndex(object):
+    """Servers of every region by name, from one listing per region.
+
+    The listing asks Nova for the servers whose name starts with 'prefix';
+    a name without that prefix (a custom 'name' in the nodes dictionary)
+    makes the region listed again without the filter.
+    """
+
+    def __init__(self, factory, prefix=None):
+        self.factory = factory
+        self.prefix = prefix or ''
+        self.listings = 0
+        # (region, filtered) -> name -> servers with that name
+        self.index = {}
+        self.lock = threading.Lock()
+        self.region_locks = {}
+
+    def _region_lock(self, region):
+        with self.lock:
+            return self.region_locks.setdefault(region, threading.Lock())
+
+    def _list(self, region, filtered):
+        search_opts = {}
+        if filtered:
+            # nova matches the name filter as a regular expression
+            search_opts['name'] = '^' + re.escape(self.prefix)
+        servers = self.factory.nova(region).servers.list(search_opts=search_opts)
+        self.listings += 1
+        names = {}
+        for server in servers:
+            names.setdefault(server.name, []).append(server)
+        return names
+
+    def _names(self, region, name):
+        filtered = bool(self.prefix) and name.startswith(self.prefix)
+        with self._region_lock(region):
+            key = (region, filtered)
+            if key not in self.index:
+                self.index[key] = self._list(region, filtered)
+            return self.index[key]
+
+    def find_all(self, region, name):
+        """All servers of a region with this name"""
+        return self._names(region, name).get(name, [])
+
+    def find(self, region, name):
+        """The server of a region with this name, None if there is none"""
+        servers = self.find_all(region, name)
+        if servers:
+            return servers[0]
+        return None
+
+
+def _rule_key(protocol, from_port, to_port, cidr):
+    # rules that allow another group have no protocol, ports or cidr
+    ports = [None if port is None else int(port) for port in (from_port, to_port)]
+    return (str(protocol).lower(), ports[0], ports[1], cidr)
+
+
+class SecurityGroupSync(object):
+    """Adds the missing SECURITY_RULES to a security group, once per region"""
+
+    def __init__(self, factory, group_name, rules=None):
+        self.factory = factory
+        self.group_name = group_name
+        self.rules = rules or SECURITY_RULES
+        # region -> rules created there
+        self.synced = {}
+        self.lock = threading.Lock()
+        self.region_locks = {}
+
+    def _region_lock(self, region):
+        with self.lock:
+            return self.region_locks.setdefault(region, threading.Lock())
+
+    def sync(self, region):
+        """Create the rules the group of this region is missing.
+
+        Returns the rules that were created; a region that was already
+        synced in this run is not looked at again.
+        """
+        with self._region_lock(region):
+            if region in self.synced:
+                return self.synced[region]
+            c = self.factory.nova(region)
+            secgroup = nshell._get_secgroup(c, self.group_name)
+            existing = set()
+            for rule in secgroup.rules:
+                existing.add(_rule_key(rule['ip_protocol'], rule['from_port'], rule['to_port'],
+                                       (rule.get('ip_range') or {}).get('cidr')))
+            created = []
+            for rule in self.rules:
+                if _rule_key(*rule) in existing:
+                    continue
+                protocol, from_port, to_port, cidr = rule
+                try:
+                    c.security_group_rules.create(secgroup.id, protocol, from_port, to_port, cidr)
+                except exceptions.BadRequest:
+                    # added by someone else since the group was read
+                    continue
+                created.append(rule)
+            self.synced[region] = created
+            return created
+
+
+class PortIndex(object):
+    """Quantum ports of a set of servers, by device id and by fixed ip"""
+
+    # device ids sent in one query, keeps the url short
+    chunk = 50
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.devices = {}
+        self.ips = {}
+        self.queries = 0
+
+    def load(self, servers):
+        """Look up the ports of servers, a list of (region, server)"""
+        by_region = {}
+        for region, server in servers:
+            by_region.setdefault(region, []).append(server.id)
+        for region, device_ids in by_region.items():
+            quantum = self.factory.quantum(region)
+            for i in range(0, len(device_ids), self.chunk):
+                ports = quantum.list_ports(device_id=device_ids[i:i + self.chunk])['ports']
+                self.queries += 1
+                for port in ports:
+                    self.devices.setdefault(port['device_id'], []).append(port)
+                    for ip in port['fixed_ips']:
+                        self.ips[ip['ip_address']] = port
+
+    def by_device(self, device_id):
+        """The ports of a server"""
+        return self.devices.get(device_id, [])
+
+    def by_ip(self, ip):
+        """The port with this fixed ip, None if it is not one of the servers'"""
+        return self.ips.get(ip)
+
+
+class ServerWaiter(object):
+    """Polls the status of servers until they are ACTIVE or in ERROR.
+
+    Each pass lists the servers of every region that still has booting
+    servers in one call and updates the tracked server objects from it.
+    Polling starts every 'min_interval' seconds and slows down to
+    'max_interval' while no server changes state.
+    """
+
+    def __init__(self, factory, prefix=None, min_interval=2, max_interval=15):
+        self.factory = factory
+        self.prefix = prefix or ''
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.listings = 0
+
+    def _list(self, region, servers):
+        search_opts = {}
+        if self.prefix and all(s.name.startswith(self.prefix) for s in servers):
+            search_opts['name'] = '^' + re.escape(self.prefix)
+        self.listings += 1
+        return self.factory.nova(region).servers.list(detailed=True, search_opts=search_opts)
+
+    def wait(self, servers, timeout=None, on_done=None):
+        """Wait for servers, a list of (region, server), to finish booting.
+
+        The server objects are updated in place, and on_done(server) is
+        called as soon as a server is ACTIVE or in ERROR. Gives up after
+        'timeout' seconds (boot_timeout in config.py) and returns the
+        servers that are still booting then, an empty list when all of
+        them are done.
+        """
+        if timeout is None:
+            timeout = boot_timeout
+        start = time.time()
+        deadline = start + timeout
+        pending = {}
+        for region, server in servers:
+            pending[server.id] = (region, server)
+        total = len(pending)
+        interval = self.min_interval
+        while pending:
+            by_region = {}
+            for region, server in pending.values():
+                by_region.setdefault(region, []).append(server)
+            changed = False
+            for region, tracked in by_region.items():
+                fresh = dict((s.id, s) for s in self._list(region, tracked))
+                for server in tracked:
+                    if server.id not in fresh:
+                        continue
+                    server._add_details(fresh[server.id]._info)
+                    if server.status in ("ACTIVE", "ERROR"):
+                        del pending[server.id]
+                        changed = True
+                        tracing.add('wait-active', start, time.time(), server.name, status=server.status)
+                        if server.status == "ERROR":
+                            print "server %s is in error" % server.name
+                        if on_done is not None:
+                            on_done(server)
+            if not pending:
+                break
+            print "server count is %s/%s " % (total - len(pending), total)
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            time.sleep(min(interval, left))
+        if pending:
+            print "%d servers are still booting after %d seconds" % (len(pending), timeout)
+        else:
+            print "All servers are done"
+        return [server for region, server in pending.values()]
+
+    def wait_deleted(self, servers, timeout=None):
+        """Wait for deleted servers, a list of (region, server), to be gone.
+
+        A server is gone once the listing of its region no longer has it
+        (or has it as DELETED). Gives up after 'timeout' seconds
+        (delete_timeout in config.py) and returns the (region, server)
+        pairs that are still there, an empty list when all are gone.
+        """
+        if timeout is None:
+            timeout = delete_timeout
+        deadline = time.time() + timeout
+        pending = {}
+        for region, server in servers:
+            pending[server.id] = (region, server)
+        total = len(pending)
+        interval = self.min_interval
+        while pending:
+            by_region = {}
+            for region, server in pending.values():
+                by_region.setdefault(region, []).append(server)
+            changed = False
+            for region, tracked in by_region.items():
+                present = dict((s.id, s) for s in self._list(region, tracked) if s.status != "DELETED")
+                for server in tracked:
+                    if server.id in present:
+                        server._add_details(present[server.id]._info)
+                        continue
+                    del pending[server.id]
+                    changed = True
+            if not pending:
+                break
+            print "deleted server count is %s/%s " % (total - len(pending), total)
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(interval * 2, self.max_interval)
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            time.sleep(min(interval, left))
+        if pending:
+            print "%d servers are still there after %d seconds" % (len(pending), timeout)
+        else:
+            print "All servers are deleted"
+        return pending.values()
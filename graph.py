@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+graph.py
+===============
+Parses the 'topology' dictionary of topology.py once into a graph: the list
+of switches and hosts, every link with both of its endpoints, and for every
+node the links it is part of. The scripts look links up here instead of
+scanning the whole topology dictionary for every node.
+
+Every link also gets its VXLAN key (VNI) here, once for the whole topology.
+The VNI of a link is derived from a hash of its two endpoint names, so it is
+the same on both ends, on every run and whatever order the nodes are set up
+in; the rare hash collisions are resolved in a fixed order.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import zlib
+
+# VXLAN network identifiers are 24 bits wide
+MAX_VNI = (1 << 24) - 1
+
+try:
+    from config import vni_range
+except ImportError:
+    vni_range = (1, MAX_VNI)
+
+
+class Link(object):
+    """A vxlan link between two nodes.
+
+    'owner' is the switch whose topology entry lists the link and 'peer' the
+    node it is listed with. For a link to a host, 'host' is that host and
+    'ip', 'bridge' and 'port' describe the host side of the link: its
+    internal ip, its bridge and its internal port.
+    """
+
+    def __init__(self, owner, peer, host=None, ip=None, bridge=None, port=None, position=0):
+        self.owner = owner
+        self.peer = peer
+        self.host = host
+        self.ip = ip
+        self.bridge = bridge
+        self.port = port
+        # index of the link in topology[owner], orders parallel links
+        self.position = position
+        self.vni = None
+
+    def key(self):
+        """Name of the link that does not depend on which side lists it"""
+        return tuple(sorted((self.owner, self.peer)))
+
+    def other(self, node):
+        if node == self.owner:
+            return self.peer
+        return self.owner
+
+    def __repr__(self):
+        return "Link(%s, %s)" % (self.owner, self.peer)
+
+
+class Graph(object):
+    """Switches, hosts and links of a topology dictionary.
+
+    switches are the keys of the topology in their dictionary order, hosts
+    are sorted by name, and links_of(node) returns the links of a node in
+    the order they appear in the topology.
+    """
+
+    def __init__(self, topology, vnis=None):
+        self.switches = list(topology.keys())
+        self.switch_set = set(self.switches)
+        self.hosts = []
+        self.links = []
+        self.incident = {}
+        for switch in self.switches:
+            self.incident[switch] = []
+        for switch in self.switches:
+            for position, entry in enumerate(topology[switch]):
+                # a host is written as (host name, internal ip[, bridge name])
+                if isinstance(entry, tuple):
+                    self._add_host_link(switch, entry, position)
+                else:
+                    if entry not in self.incident:
+                        raise ValueError("topology['%s'] links to an unknown switch: %s" % (switch, entry))
+                    self._add(Link(switch, entry, position=position))
+        self.hosts.sort()
+        assign_vnis(self.links, vnis or vni_range)
+
+    def _add(self, link):
+        self.links.append(link)
+        self.incident[link.owner].append(link)
+        if link.peer != link.owner:
+            self.incident[link.peer].append(link)
+
+    def _add_host_link(self, switch, entry, position):
+        host = entry[0]
+        if host not in self.incident:
+            self.incident[host] = []
+            self.hosts.append(host)
+        count = len(self.incident[host])
+        bridge = None
+        if len(entry) > 2:
+            bridge = entry[2]
+        self._add(Link(switch, host, host, entry[1], bridge or 'br%s' % count, 'p%s' % count, position))
+
+    def links_of(self, node):
+        return self.incident.get(node, [])
+
+    def is_switch(self, node):
+        return node in self.switch_set
+
+    def node_list(self):
+        """All nodes, the switches first and then the hosts"""
+        return self.switches + self.hosts
+
+    def __len__(self):
+        return len(self.switches) + len(self.hosts)
+
+
+def assign_vnis(links, vnis=None):
+    """Give every link a VNI from the inclusive range vnis=(first, last).
+
+    Links are numbered in a fixed order (by endpoint names, then by their
+    place in the topology) and each one starts from the hash of its name,
+    moving on to the next free VNI on a collision.
+    """
+    first, last = vnis or vni_range
+    if first < 1 or last > MAX_VNI or first > last:
+        raise ValueError("VNI range %s-%s is not within 1-%s" % (first, last, MAX_VNI))
+    size = last - first + 1
+    if len(links) > size:
+        raise ValueError("%d links do not fit in the %d VNIs of %s-%s" % (len(links), size, first, last))
+
+    ordered = sorted(links, key=lambda l: (l.key(), l.owner, l.position))
+    used = set()
+    parallel = {}
+    for link in ordered:
+        # parallel links between the same two nodes are told apart by their number
+        n = parallel.get(link.key(), 0)
+        parallel[link.key()] = n + 1
+        name = "%s|%s|%d" % (link.key()[0], link.key()[1], n)
+        vni = first + (zlib.crc32(name) & 0xffffffff) % size
+        while vni in used:
+            vni += 1
+            if vni > last:
+                vni = first
+        used.add(vni)
+        link.vni = vni
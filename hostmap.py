@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+hostmap.py
+===============
+The location of every host interface of the overlay, written by
+GetInfomrtaion.py for the controller applications: the mac of the interface
+and the datapath id and of port of the switch port it is attached to.
+
+The map is written as json ('hostmap_file' in config.py), with the hosts
+listed by ip and indexed by mac and by "dpid:port", or as csv with one
+"ip,mac,dpid,port" line per host ('hostmap_format').
+
+Next to the hosts, the json file keeps what every node contributed and a
+signature of the node's configuration (its VM, its entry in 'nodes' and its
+links); with csv these are kept in a second file, with '.nodes' appended
+to its name. In refresh mode only the nodes whose signature changed, or
+whose last read failed, are read again; the others keep what they
+contributed to the previous map.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import csv
+import hashlib
+import json
+import os
+import threading
+
+try:
+    from config import hostmap_file
+except ImportError:
+    hostmap_file = 'hosts.json'
+
+try:
+    from config import hostmap_format
+except ImportError:
+    hostmap_format = 'json'
+
+VERSION = 1
+
+# the columns of the csv form, in order
+FIELDS = ('ip', 'mac', 'dpid', 'port')
+
+
+def signature(graph, nodes, manifest, node):
+    """A hash of everything a node's port information depends on"""
+    entry = manifest.get(node) or {}
+    links = []
+    for link in graph.links_of(node):
+        links.append([link.other(node), link.vni, link.ip, link.port, link.bridge])
+    config = {'vm_id': entry.get('vm_id'), 'node': nodes.get(node), 'links': links}
+    return hashlib.sha1(json.dumps(config, sort_keys=True)).hexdigest()
+
+
+class HostMap(object):
+    """Host ip -> mac, dpid and of port, assembled from what each node reports"""
+
+    def __init__(self, path=None, format=None):
+        self.path = path or hostmap_file
+        self.format = format or hostmap_format
+        # node -> {'signature': ..., 'ports': {ip: fields}}
+        self.nodes = {}
+        self.lock = threading.Lock()
+
+    def _nodes_path(self):
+        if self.format == 'csv':
+            return self.path + '.nodes'
+        return self.path
+
+    def load(self):
+        """Read the previous map, returns False when there is no usable one"""
+        try:
+            with open(self._nodes_path()) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return False
+        if data.get('version') != VERSION:
+            return False
+        self.nodes = data.get('nodes', {})
+        return True
+
+    def unchanged(self, node, sig):
+        """True when the node was read with this signature before"""
+        entry = self.nodes.get(node)
+        return entry is not None and entry.get('signature') == sig
+
+    def start(self, node):
+        """Forget what the node contributed, before it is read again"""
+        with self.lock:
+            self.nodes[node] = {'signature': None, 'ports': {}}
+
+    def finish(self, node, sig):
+        """Keep the signature of a node once it was read in full.
+
+        A node whose read failed keeps no signature, so the next refresh
+        reads it again.
+        """
+        with self.lock:
+            self.nodes.setdefault(node, {'signature': None, 'ports': {}})['signature'] = sig
+
+    def add(self, node, ip, **fields):
+        """Set fields (mac, dpid, of_port) of a host ip, as read on a node"""
+        with self.lock:
+            entry = self.nodes.setdefault(node, {'signature': None, 'ports': {}})
+            entry['ports'].setdefault(ip, {}).update(fields)
+
+    def keep(self, nodes):
+        """Drop the nodes that are no longer in the topology"""
+        with self.lock:
+            for node in self.nodes.keys():
+                if node not in nodes:
+                    del self.nodes[node]
+
+    def hosts(self):
+        """ip -> mac, dpid and of_port, merged over all the nodes"""
+        hosts = {}
+        for node in sorted(self.nodes):
+            for ip, fields in self.nodes[node]['ports'].items():
+                hosts.setdefault(ip, {}).update(fields)
+        return hosts
+
+    def _write(self, path, write):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            write(f)
+        # a controller reloading the map never sees half of it
+        os.rename(tmp, path)
+
+    def save(self):
+        hosts = self.hosts()
+        if self.format == 'csv':
+            def write(f):
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                for ip in sorted(hosts):
+                    val = hosts[ip]
+                    writer.writerow([ip, val.get('mac'), val.get('dpid'), val.get('of_port')])
+            self._write(self.path, write)
+            data = {'version': VERSION, 'nodes': self.nodes}
+            self._write(self._nodes_path(), lambda f: json.dump(data, f, indent=1, sort_keys=True))
+            return
+        by_mac = {}
+        by_location = {}
+        for ip, val in hosts.items():
+            if val.get('mac'):
+                by_mac[val['mac']] = ip
+            if val.get('dpid') and val.get('of_port') is not None:
+                by_location["%s:%s" % (val['dpid'], val['of_port'])] = ip
+        data = {'version': VERSION, 'hosts': hosts, 'by_mac': by_mac,
+                'by_location': by_location, 'nodes': self.nodes}
+        self._write(self.path, lambda f: json.dump(data, f, indent=1, sort_keys=True))
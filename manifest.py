@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+manifest.py
+===============
+A record of a deployment, kept in a local json file ('manifest_file' in
+config.py) so that a script run after SetupNodes.py or SDNLauncher does not
+have to find the VMs in the cloud again.
+
+For every node it holds the id, name and region of its VM, its fixed ip, ssh
+user and quantum port, and its links with their bridges, VNIs and, once
+GetInfomrtaion.py has read them, the ofports and macs. An entry is only used
+while the VM name and region in it match the current configuration and its
+VM is active, as found in one server listing per region. The entry of a VM
+that is gone or failed is dropped; that of a VM still booting keeps its
+region but is not used. The other nodes are looked up in the cloud as before
+and their entries updated.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import json
+import os
+import threading
+
+try:
+    from config import manifest_file
+except ImportError:
+    manifest_file = 'deployment.json'
+
+VERSION = 1
+
+# the fields a node needs before its VM can be used without asking the cloud
+REQUIRED = ('vm_id', 'name', 'region', 'fixed_ip')
+
+
+class Manifest(object):
+    """Node name -> what is known about the node's VM and links"""
+
+    def __init__(self, path=None):
+        self.path = path or manifest_file
+        self.nodes = {}
+        # nodes whose VM was not active yet, their entries are not used
+        self.booting = set()
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Read the file, returns False when there is no usable one"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return False
+        if data.get('version') != VERSION:
+            return False
+        self.nodes = data.get('nodes', {})
+        return True
+
+    def save(self):
+        data = {'version': VERSION, 'nodes': self.nodes}
+        tmp = self.path + '.tmp'
+        with self.lock:
+            with open(tmp, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+        # replace the old file in one step, a reader never sees half of it
+        os.rename(tmp, self.path)
+
+    def get(self, node):
+        return self.nodes.get(node)
+
+    def record(self, node, **fields):
+        """Set fields of a node's entry; a new VM id starts a new entry"""
+        with self.lock:
+            entry = self.nodes.setdefault(node, {})
+            if 'vm_id' in fields and entry.get('vm_id') not in (None, fields['vm_id']):
+                entry.clear()
+            entry.update(fields)
+
+    def forget(self, node):
+        """Drop the entry of a node, e.g. once its VM is deleted"""
+        with self.lock:
+            self.nodes.pop(node, None)
+
+    def revalidate(self, server_index):
+        """Drop the entries whose VM is gone or failed.
+
+        server_index is a cloud.ServerIndex, which lists every region of the
+        entries once. An entry whose VM is not active yet is kept, but not
+        usable. Returns the nodes that were dropped.
+        """
+        dropped = []
+        for node, entry in sorted(self.nodes.items()):
+            if not entry.get('vm_id') or not entry.get('name') or not entry.get('region'):
+                continue
+            servers = [s for s in server_index.find_all(entry['region'], entry['name']) if s.id == entry['vm_id']]
+            if not servers or servers[0].status in ('ERROR', 'DELETED'):
+                self.forget(node)
+                dropped.append(node)
+            elif servers[0].status != 'ACTIVE':
+                self.booting.add(node)
+        return dropped
+
+    def usable(self, node, name, region):
+        """The entry of a node, if it is complete and for this VM name and region"""
+        entry = self.nodes.get(node)
+        if entry is None or node in self.booting:
+            return None
+        for field in REQUIRED:
+            if not entry.get(field):
+                return None
+        if entry['name'] != name or entry['region'] != region:
+            return None
+        return entry
+
+    def record_links(self, graph, nodes):
+        """Keep the bridge, vxlan port and VNI of every link of every node"""
+        with self.lock:
+            for node in graph.node_list():
+                entry = self.nodes.setdefault(node, {})
+                links = []
+                for link in graph.links_of(node):
+                    if graph.is_switch(node):
+                        # the same default as setupSwitch
+                        bridge = nodes.get(node, {}).get('bridge_name', 'br1')
+                    else:
+                        bridge = link.bridge
+                    port = "vxlan%s" % link.vni
+                    links.append({'peer': link.other(node), 'vni': link.vni, 'bridge': bridge, 'port': port})
+                entry['links'] = links
+
+    def record_port(self, node, port, **fields):
+        """Set fields (ofport, mac) of a port of a node"""
+        with self.lock:
+            entry = self.nodes.setdefault(node, {})
+            entry.setdefault('ports', {}).setdefault(port, {}).update(fields)
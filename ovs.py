@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+ovs.py
+===============
+Builds the OpenVSwitch configuration of a node as a single ovs-vsctl
+transaction ("ovs-vsctl -- cmd1 -- cmd2 ...") instead of one ssh command per
+bridge or port, so a node is configured in one round trip and the OVSDB
+changes are committed together.
+
+Commands that need the result of the commit (e.g. copying mac_in_use of an
+internal port, or bringing up its IP address) are kept apart and run after
+the transaction, in the same shell command.
+
+In reconcile mode ('ovs_reconcile' in config.py) the actual state of the node
+is read first with a single command: 'ovs-vsctl --format=json' for the
+bridges and ports, followed by 'ip -o -4 addr show' for the addresses of the
+internal ports. Only the bridges, controllers and ports that are missing or
+differ from the wanted configuration are then set, and vxlan ports left over
+from an earlier topology are deleted, on any bridge of the node (a bridge no
+longer in the topology keeps everything else). The mac of an internal port is
+copied again when it differs from mac_in_use, and its ip set again when the
+port does not have it, e.g. after a reboot. A node that is already configured
+costs one read.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import json
+import re
+
+import tracing
+
+try:
+    from config import ovs_max_ops
+except ImportError:
+    ovs_max_ops = 200
+
+try:
+    from config import ovs_reconcile
+except ImportError:
+    ovs_reconcile = False
+
+try:
+    from config import int_prefix_len
+except ImportError:
+    int_prefix_len = 24
+
+# the bridges, ports, interfaces and controllers of a node, in one call
+READ_STATE = ("sudo ovs-vsctl --format=json"
+              " -- --columns=name,ports,controller,fail_mode,datapath_id list Bridge"
+              " -- --columns=_uuid,name,interfaces list Port"
+              " -- --columns=_uuid,name,type,options,mac,mac_in_use,ofport list Interface"
+              " -- --columns=_uuid,target,connection_mode list Controller"
+              " && ip -o -4 addr show")
+
+# the ports this module creates for the links, the only ones it deletes
+VXLAN_PORT = re.compile(r'^vxlan\d+$')
+
+
+class Transaction(object):
+    """The desired OVS configuration of one node.
+
+    Every call adds a group of ovs-vsctl commands; a group is never split
+    across two transactions. When a node has more than max_ops commands
+    they are spread over several ovs-vsctl invocations.
+
+    Besides the commands, the bridges and ports asked for are kept, so that
+    reconcile() can leave out what a node already has.
+    """
+
+    def __init__(self, max_ops=None):
+        self.max_ops = max_ops or ovs_max_ops
+        # (what the group sets up, or None, commands)
+        self.groups = []
+        self.post = []
+        # bridge -> wanted controller targets, fail mode and connection mode
+        self.bridges = {}
+        # port -> wanted bridge, interface type and options
+        self.ports = {}
+        # internal port -> wanted ip/prefix
+        self.addresses = {}
+
+    def add(self, *ops):
+        self.groups.append((None, list(ops)))
+
+    def after(self, cmd):
+        """Shell command to run once the transaction is committed"""
+        self.post.append((None, cmd))
+
+    def add_bridge(self, bridge):
+        self.bridges.setdefault(bridge, None)
+        self.groups.append((('bridge', bridge), ["--may-exist add-br %s" % bridge]))
+
+    def set_controller(self, bridge, contr_addr):
+        self.bridges[bridge] = (["tcp:%s" % contr_addr], "secure", "out-of-band")
+        self.groups.append((('controller', bridge),
+                            ["set-controller %s tcp:%s" % (bridge, contr_addr),
+                             "set-fail-mode %s secure" % bridge,
+                             "set controller %s connection-mode=out-of-band" % bridge]))
+
+    def del_controller(self, bridge):
+        self.bridges[bridge] = ([], None, None)
+        self.groups.append((('controller', bridge),
+                            ["del-controller %s" % bridge,
+                             "del-fail-mode %s" % bridge]))
+
+    def add_internal_port(self, bridge, port, ip=None, prefix_len=None):
+        """Internal port, its mac set to the one in use and, if given, an ip
+        with a prefix of prefix_len bits (int_prefix_len by default)"""
+        self.ports[port] = (bridge, "internal", {})
+        self.groups.append((('port', port), ["--may-exist add-port %s %s" % (bridge, port),
+                                             "set interface %s type=internal" % port]))
+        self.post.append((('mac', port), "mac=`sudo ovs-vsctl get interface %s mac_in_use` && sudo ovs-vsctl set interface %s mac=\"$mac\"" % (port, port)))
+        if ip is not None and str(ip).lower() != "none":
+            address = "%s/%d" % (ip, prefix_len or int_prefix_len)
+            self.addresses[port] = address
+            self.post.append((('ip', port), "sudo ifconfig %s %s up" % (port, address)))
+
+    def add_vxlan_port(self, bridge, vni, remote_ip):
+        port = "vxlan%s" % vni
+        self.ports[port] = (bridge, "vxlan", {'remote_ip': str(remote_ip), 'key': str(vni)})
+        self.groups.append((('port', port),
+                            ["--may-exist add-port %s %s" % (bridge, port),
+                             "set interface %s type=vxlan options:remote_ip=%s options:key=%s" % (port, remote_ip, vni)]))
+
+    def reconcile(self, state, prune=True):
+        """A Transaction with only the changes that turn 'state' into this one.
+
+        state is the State of the node. With prune, the vxlan ports of any
+        bridge that this transaction does not ask for are deleted. The
+        mac of an internal port is copied when it was never set or differs
+        from mac_in_use, its ip set when the port lacks it.
+        """
+        txn = Transaction(self.max_ops)
+        txn.bridges = self.bridges
+        txn.ports = self.ports
+        txn.addresses = self.addresses
+        needed = set()
+        for bridge, controller in self.bridges.items():
+            have = state.bridges.get(bridge)
+            if have is None:
+                needed.add(('bridge', bridge))
+                needed.add(('controller', bridge))
+            elif controller is not None and have['controller'] != controller:
+                needed.add(('controller', bridge))
+        for port, (bridge, kind, options) in self.ports.items():
+            have = state.ports.get(port)
+            if have is not None and have['bridge'] != bridge:
+                # the port moved to another bridge
+                txn.add("--if-exists del-port %s %s" % (have['bridge'], port))
+                have = None
+            if have is None or have['type'] != kind:
+                needed.update([('port', port), ('mac', port), ('ip', port)])
+                continue
+            if kind == "internal" and have['mac_set'] != have['mac']:
+                needed.add(('mac', port))
+            if port in self.addresses and self.addresses[port] not in state.addresses.get(port, []):
+                needed.add(('ip', port))
+            for key, value in options.items():
+                if have['options'].get(key) != value:
+                    needed.add(('port', port))
+        if prune:
+            for port, have in sorted(state.ports.items()):
+                if port not in self.ports and VXLAN_PORT.match(port):
+                    txn.add("--if-exists del-port %s %s" % (have['bridge'], port))
+        for key, ops in self.groups:
+            if key is None or key in needed:
+                txn.groups.append((key, ops))
+        for key, cmd in self.post:
+            if key is None or key in needed:
+                txn.post.append((key, cmd))
+        return txn
+
+    def batches(self):
+        """Split the groups into lists of at most max_ops commands"""
+        batches = []
+        batch = []
+        for key, group in self.groups:
+            if batch and len(batch) + len(group) > self.max_ops:
+                batches.append(batch)
+                batch = []
+            batch.extend(group)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def commands(self):
+        """The ovs-vsctl invocations followed by the post-commit commands"""
+        cmds = ["sudo ovs-vsctl -- %s" % " -- ".join(batch) for batch in self.batches()]
+        return cmds + [cmd for key, cmd in self.post]
+
+    def command(self):
+        """Everything as one shell command, stopping at the first failure"""
+        return " && ".join(self.commands())
+
+
+def _value(value):
+    """An OVSDB json value as a python one: uuids as strings, sets as lists, maps as dicts"""
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] == 'uuid':
+            return value[1]
+        if value[0] == 'set':
+            return [_value(v) for v in value[1]]
+        if value[0] == 'map':
+            return dict((_value(k), _value(v)) for k, v in value[1])
+    return value
+
+
+def _as_list(value):
+    # a set of one element is written as the element itself
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _scalar(value):
+    # an optional column is an empty set while it has no value
+    if isinstance(value, list):
+        if not value:
+            return None
+        return value[0]
+    return value
+
+
+def _tables(output, count):
+    """The rows of the first count tables in the output of READ_STATE, as
+    dicts, and the rest of the output"""
+    decoder = json.JSONDecoder()
+    tables = []
+    pos = 0
+    output = output.strip()
+    while len(tables) < count:
+        table, pos = decoder.raw_decode(output, pos)
+        while pos < len(output) and output[pos].isspace():
+            pos += 1
+        tables.append([dict(zip(table['headings'], [_value(v) for v in row])) for row in table['data']])
+    return tables, output[pos:]
+
+
+def _addresses(output):
+    """interface -> its ip/prefix addresses, from the output of 'ip -o -4 addr show'"""
+    addresses = {}
+    for line in output.splitlines():
+        words = line.split()
+        if len(words) >= 4 and words[2] == 'inet':
+            addresses.setdefault(words[1], []).append(words[3])
+    return addresses
+
+
+class State(object):
+    """The bridges and ports of a node, from the output of READ_STATE.
+
+    bridges maps a bridge name to its controller settings and datapath id,
+    ports maps a port name to its bridge, interface type, options, mac in
+    use, mac set in the database and ofport. addresses maps an interface to
+    its ip/prefix addresses.
+    """
+
+    def __init__(self, output):
+        (bridges, ports, interfaces, controllers), rest = _tables(output, 4)
+        self.addresses = _addresses(rest)
+        interfaces = dict((row['_uuid'], row) for row in interfaces)
+        controllers = dict((row['_uuid'], row) for row in controllers)
+        port_rows = dict((row['_uuid'], row) for row in ports)
+        self.bridges = {}
+        self.ports = {}
+        for row in bridges:
+            targets = []
+            modes = set()
+            for uuid in _as_list(row['controller']):
+                targets.append(controllers[uuid]['target'])
+                modes.add(_scalar(controllers[uuid]['connection_mode']))
+            mode = None
+            if len(modes) == 1:
+                mode = modes.pop()
+            self.bridges[row['name']] = {'controller': (sorted(targets), _scalar(row['fail_mode']), mode),
+                                         'dpid': _scalar(row['datapath_id'])}
+            for uuid in _as_list(row['ports']):
+                port = port_rows[uuid]
+                iface = interfaces[_as_list(port['interfaces'])[0]]
+                self.ports[port['name']] = {'bridge': row['name'], 'type': iface['type'], 'options': iface['options'],
+                                            'mac': _scalar(iface['mac_in_use']), 'mac_set': _scalar(iface['mac']),
+                                            'ofport': _scalar(iface['ofport'])}
+
+
+def read_state(sessions, node):
+    """The State of a node, read through a remote.SessionPool"""
+    return State(sessions.run(node, READ_STATE).stdout)
+
+
+def configure(sessions, node, txn, reconcile=None, prune=True):
+    """Apply a Transaction to a node through a remote.SessionPool.
+
+    In reconcile mode the node's state is read first and only what differs
+    is applied; prune as in Transaction.reconcile(). Returns what was run.
+    """
+    if reconcile is None:
+        reconcile = ovs_reconcile
+    if reconcile:
+        with tracing.span('ovs-read', node):
+            txn = txn.reconcile(read_state(sessions, node), prune)
+    if txn.groups or txn.post:
+        with tracing.span('ovs-apply', node, ops=sum(len(ops) for key, ops in txn.groups)):
+            sessions.run(node, txn.command())
+    return txn
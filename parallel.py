@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+parallel.py
+===============
+A bounded worker pool for per-node work. Every node is handled by one call
+of the given function; the outcome of each call (value or exception, and how
+long it took) is kept in a NodeResult so that one failing node does not stop
+the others, and all the failures can be reported together at the end.
+
+run_parallel() handles a list of nodes known up front; WorkerPool takes new
+work while it is running, for work that only becomes possible as other work
+finishes.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import collections
+import threading
+import time
+import traceback
+import Queue
+
+from prettytable import PrettyTable
+
+try:
+    from config import max_workers
+except ImportError:
+    max_workers = 10
+
+try:
+    from config import region_workers
+except ImportError:
+    region_workers = {}
+
+
+class NodeResult(object):
+    """Outcome of running the worker function on a single node"""
+
+    def __init__(self, node):
+        self.node = node
+        self.ok = False
+        self.value = None
+        self.error = None
+        self.trace = None
+        self.elapsed = 0.0
+
+
+def _run_one(func, item, name=None):
+    result = NodeResult(name or item)
+    start = time.time()
+    try:
+        result.value = func(item)
+        result.ok = True
+    except Exception, e:
+        result.error = e
+        result.trace = traceback.format_exc()
+    result.elapsed = time.time() - start
+    return result
+
+
+def run_parallel(func, items, workers=None, group=None, limits=None):
+    """Call func(item) for every item, running at most 'workers' at a time.
+
+    Returns a list of NodeResult in the same order as items. With workers
+    set to 1 the items are handled one after the other in the calling thread.
+
+    group(item) can put the items in groups (e.g. by region); limits maps a
+    group to the most items of that group that may run at the same time.
+    A free worker takes the first waiting item of a group below its limit,
+    so a group at its limit does not hold up the items of the others.
+    """
+    items = list(items)
+    group_limits = {}
+    if group is not None and limits:
+        group_limits = dict((name, max(1, limit)) for name, limit in limits.items())
+    if workers is None:
+        workers = max_workers
+    workers = max(1, min(workers, len(items)))
+    results = [None] * len(items)
+
+    if workers == 1:
+        for i, item in enumerate(items):
+            results[i] = _run_one(func, item)
+        return results
+
+    # the waiting items of every group, in order, and how many of each run
+    waiting = {}
+    for i, item in enumerate(items):
+        key = None
+        if group_limits:
+            key = group(item)
+        waiting.setdefault(key, collections.deque()).append((i, item))
+    running = dict((key, 0) for key in waiting)
+    changed = threading.Condition()
+
+    def take():
+        with changed:
+            while True:
+                free = [(queue[0][0], key) for key, queue in waiting.items()
+                        if queue and running[key] < group_limits.get(key, len(items))]
+                if free:
+                    key = min(free)[1]
+                    running[key] += 1
+                    return key, waiting[key].popleft()
+                if not any(waiting.values()):
+                    return None
+                # every group with items left is at its limit
+                changed.wait(1)
+
+    def worker():
+        while True:
+            job = take()
+            if job is None:
+                return
+            key, (i, item) = job
+            try:
+                results[i] = _run_one(func, item)
+            finally:
+                with changed:
+                    running[key] -= 1
+                    changed.notify_all()
+
+    threads = []
+    for n in range(workers):
+        t = threading.Thread(target=worker, name="worker-%d" % n)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+    for t in threads:
+        # join with a timeout so that Ctrl-C still reaches the main thread
+        while t.is_alive():
+            t.join(1)
+    return results
+
+
+class WorkerPool(object):
+    """Worker threads running jobs that can be submitted at any time.
+
+    submit() may also be called from inside a job; join() waits until every
+    submitted job, including those, is done and returns their NodeResults
+    in the order the jobs finished.
+    """
+
+    def __init__(self, workers=None):
+        self.work = Queue.Queue()
+        self.results = []
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.threads = []
+        for n in range(max(1, workers or max_workers)):
+            t = threading.Thread(target=self._worker, name="pool-%d" % n)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def _worker(self):
+        while True:
+            job = self.work.get()
+            if job is None:
+                return
+            result = _run_one(*job)
+            with self.idle:
+                self.results.append(result)
+                self.pending -= 1
+                self.idle.notify_all()
+
+    def submit(self, func, item, name=None):
+        """Run func(item) on a free worker; name is shown in the results"""
+        with self.idle:
+            self.pending += 1
+        self.work.put((func, item, name))
+
+    def join(self):
+        with self.idle:
+            while self.pending:
+                # wait with a timeout so that Ctrl-C still reaches the main thread
+                self.idle.wait(1)
+        for t in self.threads:
+            self.work.put(None)
+        return list(self.results)
+
+
+def print_results(results, title=None):
+    """Print a summary table of the results and return the failed ones"""
+    x = PrettyTable(["Node", "Status", "Time (s)", "Error"])
+    failed = []
+    for result in results:
+        if result.ok:
+            x.add_row([result.node, "OK", "%.1f" % result.elapsed, ""])
+        else:
+            failed.append(result)
+            x.add_row([result.node, "FAILED", "%.1f" % result.elapsed, str(result.error)])
+    if title:
+        print "\n%s" % title
+    print x
+    for result in failed:
+        print "\n----- %s -----\n%s" % (result.node, result.trace)
+    if results:
+        slowest = max(results, key=lambda r: r.elapsed)
+        print "%d/%d nodes done, slowest node: %s (%.1f seconds)\n" % (
+            len(results) - len(failed), len(results), slowest.node, slowest.elapsed)
+    return failed
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+pipeline.py
+===============
+Sets up the overlay while the VMs are still coming up, instead of waiting
+for all of them to boot first.
+
+A node is configured as soon as its address is known and it accepts ssh
+connections, together with the links to the nodes whose address is already
+known. A link whose other end only gets its address later is added to the
+node on its own once that happens. The whole topology is then done shortly
+after the slowest VM has booted.
+
+Waiting for a node to become ready happens on threads of its own; a node
+is only handed to the configuration workers once it is ready, so nodes that
+are still booting never hold up the ones that can be configured.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import threading
+
+from parallel import WorkerPool
+
+
+class Pipeline(object):
+    """Configures the nodes and links of a Graph as their VMs become ready.
+
+    configure(node, links, base) does the work on a node: with base=True
+    the node itself and the given links, with base=False only the links;
+    it is called in the worker pool. ready(node), if given, blocks until
+    the node can be configured; it is called in a pool of ready_workers
+    threads of its own.
+    """
+
+    def __init__(self, graph, configure, ready=None, workers=None, ready_workers=None):
+        self.graph = graph
+        self.configure = configure
+        self.ready = ready
+        # nodes whose address is known
+        self.addresses = set()
+        # nodes that are configured, links can be added to them
+        self.configured = set()
+        # (node, link) pairs that were handed to configure()
+        self.claimed = set()
+        self.lock = threading.Lock()
+        self.pool = WorkerPool(workers)
+        self.poller = None
+        if ready is not None:
+            self.poller = WorkerPool(ready_workers)
+
+    def _claim(self, node, links):
+        """The links of node not claimed yet whose other end has an address"""
+        claimed = []
+        for link in links:
+            if link.other(node) not in self.addresses:
+                continue
+            if (node, link) in self.claimed:
+                continue
+            self.claimed.add((node, link))
+            claimed.append(link)
+        return claimed
+
+    def address_known(self, node):
+        """Tell the pipeline the address of a node is known"""
+        with self.lock:
+            self.addresses.add(node)
+            for link in self.graph.links_of(node):
+                peer = link.other(node)
+                if peer != node and peer in self.configured:
+                    for claimed in self._claim(peer, [link]):
+                        self.pool.submit(self._setup_link, (peer, claimed),
+                                         "%s -> %s" % (peer, node))
+        if self.poller is not None:
+            self.poller.submit(self._wait_ready, node)
+        else:
+            self.pool.submit(self._setup_node, node)
+
+    def _wait_ready(self, node):
+        self.ready(node)
+        self.pool.submit(self._setup_node, node)
+
+    def _setup_node(self, node):
+        with self.lock:
+            links = self._claim(node, self.graph.links_of(node))
+        self.configure(node, links, True)
+        with self.lock:
+            self.configured.add(node)
+            # links whose other end got its address while this node was set up
+            missing = self._claim(node, self.graph.links_of(node))
+        if missing:
+            self.configure(node, missing, False)
+
+    def _setup_link(self, job):
+        node, link = job
+        self.configure(node, [link], False)
+
+    def unfinished(self):
+        """(node, link) pairs that were never handed to configure()"""
+        with self.lock:
+            return [(node, link) for node in self.graph.node_list()
+                    for link in self.graph.links_of(node)
+                    if (node, link) not in self.claimed]
+
+    def join(self):
+        """Wait for the work in progress, returns the NodeResults of the
+        configuration and of the nodes that never became ready"""
+        failed = []
+        if self.poller is not None:
+            # every node submitted to the pool is submitted by then
+            failed = [result for result in self.poller.join() if not result.ok]
+        return failed + self.pool.join()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+placement.py
+===============
+Picks the compute host (hypervisor) of every VM so that as many links as
+possible join two VMs of the same host, whose vxlan traffic then never
+leaves that host.
+
+The hosts of every region and the number of VMs each of them takes are set
+with 'placement_hosts' in config.py. The nodes of a region are split over
+its hosts by growing one group of tightly linked nodes per host, then
+improved by moving and swapping nodes between hosts while that removes
+cross-host links. A node with a 'server' in the nodes dictionary stays on
+that host and counts against its capacity; the nodes that do not fit are
+left to the Nova scheduler.
+
+The scripts pass the chosen host as the 'force_hosts' scheduler hint and,
+once the VMs are up, compare it with the OS-EXT-SRV-ATTR:host of each VM.
+
+With 'region_assignment' the regions are picked the same way one level up:
+a link between two regions costs their latency in 'region_latency', and
+every region takes as many VMs as its quota, from 'region_quotas' or else
+what Nova reports is left of the tenant's instance quota. Nodes with a
+'region' in the nodes dictionary stay in it, the others fill the default
+region first, then the regions closest to it. SetupTopology.py and
+GetInfomrtaion.py keep the regions recorded in the manifest at launch.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+from prettytable import PrettyTable
+
+try:
+    from config import placement_hosts
+except ImportError:
+    placement_hosts = {}
+
+try:
+    from config import region_assignment
+except ImportError:
+    region_assignment = False
+
+try:
+    from config import region_latency
+except ImportError:
+    region_latency = {}
+
+try:
+    from config import region_quotas
+except ImportError:
+    region_quotas = {}
+
+
+def link_weights(graph):
+    """(node, node) -> number of links between them, each pair once"""
+    weights = {}
+    for link in graph.links:
+        if link.owner == link.peer:
+            continue
+        key = link.key()
+        weights[key] = weights.get(key, 0) + 1
+    return weights
+
+
+def cut(assignment, weights):
+    """Links whose two ends are not known to be on the same host"""
+    count = 0
+    for (a, b), w in weights.items():
+        host = assignment.get(a)
+        if host is None or host != assignment.get(b):
+            count += w
+    return count
+
+
+def _neighbours(members, weights):
+    nbr = dict((node, {}) for node in members)
+    for (a, b), w in weights.items():
+        if a in nbr and b in nbr:
+            nbr[a][b] = nbr[a].get(b, 0) + w
+            nbr[b][a] = nbr[b].get(a, 0) + w
+    return nbr
+
+
+def _distance(a, b):
+    return 0 if a == b else 1
+
+
+def partition(members, weights, capacity, pinned=None, passes=10, distance=None, order=None):
+    """Assign members to the hosts of capacity (host -> VMs it takes).
+
+    pinned maps the nodes that have to stay on a host to that host.
+    distance(host, host) is the cost of a link between two hosts, 1 for any
+    two hosts by default; order is the order in which the hosts are filled,
+    the roomiest first by default.
+    Returns node -> host for the nodes that found room.
+    """
+    distance = distance or _distance
+    pinned = dict((node, host) for node, host in (pinned or {}).items() if node in members)
+    nbr = _neighbours(members, weights)
+    assignment = dict(pinned)
+    free = dict(capacity)
+    for node, host in pinned.items():
+        if host in free:
+            free[host] -= 1
+
+    def degree(node):
+        return sum(nbr[node].values())
+
+    # grow the group of every host from the node most connected to what is
+    # already on it
+    unassigned = set(node for node in members if node not in assignment)
+    for host in order or sorted(free, key=lambda h: (-free[h], h)):
+        score = {}
+        for node, on in assignment.items():
+            if on == host:
+                for other, w in nbr[node].items():
+                    if other in unassigned:
+                        score[other] = score.get(other, 0) + w
+        while free[host] > 0 and unassigned:
+            if score:
+                node = max(score, key=lambda n: (score[n], degree(n), n))
+                del score[node]
+            else:
+                node = max(unassigned, key=lambda n: (degree(n), n))
+            assignment[node] = host
+            unassigned.discard(node)
+            free[host] -= 1
+            for other, w in nbr[node].items():
+                if other in unassigned:
+                    score[other] = score.get(other, 0) + w
+
+    def cost(node, host):
+        total = 0
+        for other, w in nbr[node].items():
+            if other in assignment:
+                total += w * distance(host, assignment[other])
+        return total
+
+    # move a node to the host where its links cost the least, or swap it
+    # with a node there when that host is full
+    movable = sorted(node for node in assignment if node not in pinned)
+    for n in range(passes):
+        improved = False
+        for node in movable:
+            here = assignment[node]
+            now = cost(node, here)
+            best, gain = None, 0
+            for host in free:
+                if host != here and now - cost(node, host) > gain:
+                    best, gain = host, now - cost(node, host)
+            if best is None:
+                continue
+            if free[best] > 0:
+                assignment[node] = best
+                free[best] -= 1
+                free[here] += 1
+                improved = True
+                continue
+            swap, swap_gain = None, 0
+            for other in movable:
+                if assignment[other] != best:
+                    continue
+                before = now + cost(other, best)
+                assignment[node], assignment[other] = best, here
+                g = before - cost(node, best) - cost(other, here)
+                assignment[node], assignment[other] = here, best
+                if g > swap_gain:
+                    swap, swap_gain = other, g
+            if swap is not None:
+                assignment[node], assignment[swap] = best, here
+                improved = True
+        if not improved:
+            break
+    return assignment
+
+
+def plan(graph, nodes, default_region, hosts=None):
+    """node -> host for the nodes of every region that has placement_hosts"""
+    hosts = placement_hosts if hosts is None else hosts
+    if not hosts:
+        return {}
+    weights = link_weights(graph)
+    by_region = {}
+    for node in graph.node_list():
+        region = nodes.get(node, {}).get('region', default_region)
+        by_region.setdefault(region, []).append(node)
+    assignment = {}
+    for region, members in by_region.items():
+        if region not in hosts:
+            continue
+        pinned = {}
+        for node in members:
+            if nodes.get(node, {}).get('server'):
+                pinned[node] = nodes[node]['server']
+        placed = partition(members, weights, hosts[region], pinned)
+        left = len(members) - len(placed)
+        if left:
+            print "placement: no room for %d nodes of %s on its hosts, nova picks theirs" % (left, region)
+        assignment.update(placed)
+    return assignment
+
+
+def print_plan(graph, assignment):
+    """How many nodes go on every host and how many links cross hosts"""
+    if not assignment:
+        return
+    weights = link_weights(graph)
+    count = {}
+    for node, host in assignment.items():
+        count[host] = count.get(host, 0) + 1
+    x = PrettyTable(["Host", "VMs"])
+    for host in sorted(count):
+        x.add_row([host, count[host]])
+    print x
+    print "placement: %d of %d links cross hosts\n" % (cut(assignment, weights), sum(weights.values()))
+
+
+def print_check(graph, wanted, actual):
+    """Compare the planned hosts with the ones the VMs ended up on (node -> host)"""
+    if not wanted:
+        return []
+    misplaced = [node for node in sorted(wanted) if node in actual and actual[node] != wanted[node]]
+    weights = link_weights(graph)
+    print "placement: %d/%d VMs on their planned host, %d of %d links cross hosts\n" % (
+        len([node for node in wanted if node in actual]) - len(misplaced), len(wanted),
+        cut(actual, weights), sum(weights.values()))
+    return misplaced
+
+
+def latency(a, b, matrix=None):
+    """ms between two regions; a pair missing from the matrix counts as its slowest one"""
+    matrix = region_latency if matrix is None else matrix
+    if a == b:
+        return 0
+    if (a, b) in matrix:
+        return matrix[(a, b)]
+    if (b, a) in matrix:
+        return matrix[(b, a)]
+    return max(matrix.values() or [0])
+
+
+def region_quota(clients, region, recorded=0):
+    """VMs of the deployment a region can hold, None when it is not known.
+
+    recorded is the number of VMs of the deployment already in the region;
+    Nova counts them as used, yet they are part of what the region holds.
+    """
+    if region in region_quotas:
+        return region_quotas[region]
+    try:
+        limits = dict((limit.name, limit.value) for limit in clients.nova(region).limits.get().absolute)
+        return limits['maxTotalInstances'] - limits.get('totalInstancesUsed', 0) + recorded
+    except Exception, e:
+        print "placement: no instance quota of %s (%s)" % (region, e)
+        return None
+
+
+def assign_regions(graph, nodes, default_region, clients, manifest=None, matrix=None):
+    """Set the region of the nodes without one in 'nodes', with region_assignment.
+
+    The nodes recorded in the manifest, when one is given, keep the region
+    they were launched in. Returns node -> region for the nodes it set.
+    """
+    matrix = region_latency if matrix is None else matrix
+    if not region_assignment:
+        return {}
+    members = graph.node_list()
+    regions = set([default_region])
+    for a, b in matrix:
+        regions.update([a, b])
+    pinned = {}
+    # region -> VMs of the deployment recorded in it
+    recorded = {}
+    for node in members:
+        region = nodes.get(node, {}).get('region')
+        if manifest is not None:
+            entry = manifest.get(node) or {}
+            if entry.get('vm_id') and entry.get('region'):
+                recorded[entry['region']] = recorded.get(entry['region'], 0) + 1
+            if not region:
+                region = entry.get('region')
+        if region:
+            pinned[node] = region
+            regions.add(region)
+    if len(pinned) == len(members):
+        chosen = {}
+    else:
+        capacity = {}
+        for region in regions:
+            quota = region_quota(clients, region, recorded.get(region, 0))
+            capacity[region] = len(members) if quota is None else max(0, quota)
+        order = sorted(regions, key=lambda r: (latency(default_region, r, matrix), r))
+        placed = partition(members, link_weights(graph), capacity, pinned,
+                           distance=lambda a, b: latency(a, b, matrix), order=order)
+        left = [node for node in members if node not in placed]
+        if left:
+            print "placement: no quota left for %d nodes, they go to %s" % (len(left), default_region)
+        chosen = dict((node, placed[node]) for node in placed if node not in pinned)
+    for node, region in pinned.items():
+        if not nodes.get(node, {}).get('region'):
+            chosen[node] = region
+    for node, region in chosen.items():
+        nodes.setdefault(node, {})['region'] = region
+    return chosen
+
+
+def print_regions(graph, nodes, default_region, matrix=None):
+    """The VMs of every region, the links between regions and the latency they add"""
+    matrix = region_latency if matrix is None else matrix
+    if not region_assignment:
+        return
+    weights = link_weights(graph)
+    region_of = dict((node, nodes.get(node, {}).get('region', default_region)) for node in graph.node_list())
+    count = {}
+    for node, region in region_of.items():
+        count[region] = count.get(region, 0) + 1
+    x = PrettyTable(["Region", "VMs"])
+    for region in sorted(count):
+        x.add_row([region, count[region]])
+    print x
+    crossing = 0
+    added = []
+    for (a, b), w in weights.items():
+        if region_of[a] != region_of[b]:
+            crossing += w
+            added += [latency(region_of[a], region_of[b], matrix)] * w
+    print "placement: %d of %d links cross regions, adding %.1f ms in total, %.1f ms on the slowest\n" % (
+        crossing, sum(weights.values()), sum(added), max(added or [0]))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+readiness.py
+===============
+Decides when a freshly booted VM is ready to be used, with a set of probes
+that are polled one after the other until each of them passes:
+
+    tcp         the ssh port accepts connections
+    console     the console log shows the fixed ip and the ssh host keys
+    cloud-init  cloud-init has finished (checked over ssh)
+
+The console probe only asks Nova for the tail of the console log and keeps
+track of the lines it has already looked at, instead of downloading the
+whole log on every poll.
+
+The probes to use are set with 'readiness_probes' in config.py, only tcp by
+default: an image that does not write the ssh host keys to its console would
+never pass the console probe. Its markers are 'readiness_console_markers'.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import socket
+import time
+
+import tracing
+
+try:
+    from config import readiness_probes
+except ImportError:
+    readiness_probes = ['tcp']
+
+try:
+    from config import readiness_console_markers
+except ImportError:
+    readiness_console_markers = ["Generation complete."]
+
+try:
+    from config import readiness_timeout
+except ImportError:
+    readiness_timeout = 300
+
+try:
+    from config import readiness_workers
+except ImportError:
+    readiness_workers = 50
+
+
+class NotReady(Exception):
+    """A node did not pass its probes in time"""
+    pass
+
+
+class Probe(object):
+    """Something to poll until a node is ready.
+
+    A probe object is made for one node and may keep state between its
+    polls. Every probe has a check(node) method that returns True once the
+    node passes; 'node' is a sanity.Node. New probes are listed in PROBES.
+    """
+
+    name = None
+
+
+class TcpProbe(Probe):
+    """The node accepts tcp connections on 'port'"""
+
+    name = 'tcp'
+
+    def __init__(self, port=22, timeout=3):
+        self.port = port
+        self.timeout = timeout
+
+    def check(self, node):
+        try:
+            sock = socket.create_connection((node.fixed_ip, self.port), self.timeout)
+        except (socket.error, socket.timeout):
+            return False
+        sock.close()
+        return True
+
+
+class ConsoleProbe(Probe):
+    """All the markers, and the fixed ip of the node, are in its console log.
+
+    Every poll fetches the last 'length' lines of the log; Nova has no
+    offset to read from, so the last lines of the previous poll (see
+    _anchor) tell whether the tail still reaches back to them. When it does
+    not, lines were missed and the next poll asks for twice as many lines,
+    up to 'max_length'. When it does, the next poll asks for twice the lines
+    that were new, but never fewer than the initial 'length'. All the
+    fetched lines are searched for the markers.
+    """
+
+    name = 'console'
+
+    def __init__(self, markers=None, length=100, max_length=6400):
+        self.markers = readiness_console_markers if markers is None else markers
+        self.length = length
+        self.min_length = length
+        self.max_length = max_length
+        # the last lines of the previous poll, to find where the new ones start
+        self.anchor = None
+        self.found = set()
+        self.fetched = 0
+
+    def _anchor(self, lines, distinct=3, most=20):
+        """The last lines, going back until 'distinct' different ones are in
+        them, so that a run of identical progress lines is not an anchor"""
+        anchor = lines[-distinct:]
+        while len(set(anchor)) < distinct and len(anchor) < min(most, len(lines)):
+            anchor = lines[-len(anchor) - 1:]
+        return anchor
+
+    def _new_count(self, lines):
+        """The number of lines after the anchor, None when it is not in lines"""
+        if self.anchor is not None:
+            n = len(self.anchor)
+            for i in range(len(lines) - n, -1, -1):
+                if lines[i:i + n] == self.anchor:
+                    return len(lines) - i - n
+        return None
+
+    def check(self, node):
+        wanted = list(self.markers)
+        if node.fixed_ip:
+            wanted.append(node.fixed_ip)
+        output = node.server.get_console_output(length=self.length)
+        self.fetched += len(output)
+        lines = output.splitlines()
+        for line in lines:
+            for marker in wanted:
+                if marker in line:
+                    self.found.add(marker)
+        new = self._new_count(lines)
+        if len(lines) < self.length:
+            # the whole log
+            new = len(lines)
+        if new is not None or self.length >= self.max_length:
+            self.anchor = self._anchor(lines)
+            if new is not None:
+                self.length = min(max(self.min_length, 2 * new), self.max_length)
+        else:
+            # lines were missed, look further back next time
+            self.anchor = None
+            self.length = min(self.length * 2, self.max_length)
+        return all(marker in self.found for marker in wanted)
+
+
+class CloudInitProbe(Probe):
+    """cloud-init has written its boot-finished file"""
+
+    name = 'cloud-init'
+
+    def check(self, node):
+        try:
+            result = node.sessions.run(node.name, "test -f /var/lib/cloud/instance/boot-finished", check=False)
+        except Exception:
+            return False
+        return result.exit_status == 0
+
+
+PROBES = {
+    'tcp': TcpProbe,
+    'console': ConsoleProbe,
+    'cloud-init': CloudInitProbe,
+}
+
+
+class ProbeResult(object):
+    """How long a node took to pass one probe"""
+
+    def __init__(self, name):
+        self.name = name
+        self.ok = False
+        self.polls = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return "%s %s %.1fs (%d polls)" % (self.name, self.ok and "OK" or "FAILED", self.elapsed, self.polls)
+
+
+def wait_ready(node, probes=None, timeout=None, interval=3):
+    """Poll the probes of a sanity.Node in order until all of them pass.
+
+    :param probes: names of the probes, 'readiness_probes' by default
+    :param timeout: seconds for all the probes together
+    Returns a ProbeResult per probe; raises NotReady when the time is up.
+    """
+    deadline = time.time() + (timeout or readiness_timeout)
+    results = []
+    for name in probes or readiness_probes:
+        probe = PROBES[name]()
+        result = ProbeResult(name)
+        results.append(result)
+        start = time.time()
+        while True:
+            result.polls += 1
+            result.ok = probe.check(node)
+            result.elapsed = time.time() - start
+            if result.ok:
+                break
+            if time.time() + interval > deadline:
+                tracing.add('probe-%s' % name, start, time.time(), node.name, polls=result.polls, ok=False)
+                raise NotReady("%s not ready: %s" % (node.name, ", ".join(str(r) for r in results)))
+            time.sleep(interval)
+        tracing.add('probe-%s' % name, start, time.time(), node.name, polls=result.polls, ok=True)
+    return results
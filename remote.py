@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+remote.py
+===============
+Runs commands on the VMs over ssh. Instead of firing a command and sleeping
+for a while, run() waits until the command has exited, keeps its exit status,
+stdout and stderr and how long it took, and raises RemoteCommandError when
+the command failed so the caller stops at the first broken step.
+
+The last 'ssh_history' commands run in this process are kept in 'history'.
+
+SessionPool keeps one ssh session per node for the lifetime of the process,
+so the sanity test, the OVS setup and the information queries share the same
+connection instead of each doing their own key exchange. The private key is
+read once for all of them.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import collections
+import socket
+import threading
+import time
+import paramiko
+
+import tracing
+
+try:
+    from config import ssh_timeout
+except ImportError:
+    ssh_timeout = 20
+
+try:
+    from config import ssh_keepalive
+except ImportError:
+    ssh_keepalive = 30
+
+try:
+    from config import ssh_wait_timeout
+except ImportError:
+    ssh_wait_timeout = 300
+
+try:
+    from config import ssh_history
+except ImportError:
+    ssh_history = 1000
+
+
+class CommandResult(object):
+    """Outcome of a single remote command"""
+
+    def __init__(self, node, command):
+        self.node = node
+        self.command = command
+        self.exit_status = None
+        self.stdout = ''
+        self.stderr = ''
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return "%s: '%s' exited with %s after %.2f seconds" % (
+            self.node, self.command, self.exit_status, self.elapsed)
+
+
+class RemoteCommandError(Exception):
+    """A remote command exited with a nonzero status"""
+
+    def __init__(self, result):
+        Exception.__init__(self, "%s\n%s" % (result, result.stderr.strip()))
+        self.result = result
+
+
+class NotSent(Exception):
+    """The session broke before a command was sent, it did not run"""
+    pass
+
+
+history = collections.deque(maxlen=ssh_history)
+history_lock = threading.Lock()
+
+
+def connect(ip, username, key_filename=None, timeout=None, pkey=None):
+    """Open an ssh connection; returns once the session is authenticated"""
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(ip, username=username, key_filename=key_filename, pkey=pkey,
+                timeout=timeout or ssh_timeout)
+    return ssh
+
+
+def load_key(key_filename):
+    """Read a private key file, whatever its type"""
+    error = None
+    for name in ('RSAKey', 'DSSKey', 'ECDSAKey'):
+        key_class = getattr(paramiko, name, None)
+        if key_class is None:
+            continue
+        try:
+            return key_class.from_private_key_file(key_filename)
+        except paramiko.SSHException, e:
+            error = e
+    raise error
+
+
+def run(ssh, command, node=None, check=True, timeout=None):
+    """Run command on ssh and wait for it to finish.
+
+    :param node: name used in the result and error messages
+    :param check: raise RemoteCommandError if the exit status is not 0
+    :param timeout: seconds to wait for output before giving up
+
+    Raises NotSent when the command could not be started; an error once it
+    was started, such as a timeout, is raised as it is.
+    """
+    result = CommandResult(node, command)
+    start = time.time()
+    try:
+        stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout or None)
+    except (paramiko.SSHException, socket.error, EOFError), e:
+        raise NotSent("%s: %s" % (node, e))
+    stdin.close()
+    # read both streams before asking for the exit status, otherwise a
+    # command with a lot of output can block on a full channel window
+    result.stdout = stdout.read()
+    result.stderr = stderr.read()
+    result.exit_status = stdout.channel.recv_exit_status()
+    result.elapsed = time.time() - start
+    with history_lock:
+        history.append(result)
+    if check and result.exit_status != 0:
+        raise RemoteCommandError(result)
+    return result
+
+
+class SessionPool(object):
+    """Live ssh sessions keyed by node name.
+
+    Nodes are registered with their address once; get() hands out the
+    node's open session, and opens a new one when there is none yet or the
+    old one has died. run() retries a command once on a fresh session if
+    the connection breaks while it is running.
+    """
+
+    def __init__(self, key_filename, keepalive=None, timeout=None):
+        self.key_filename = key_filename
+        self.keepalive = keepalive or ssh_keepalive
+        self.timeout = timeout
+        self.pkey = None
+        self.addresses = {}
+        self.sessions = {}
+        self.connects = 0
+        self.lock = threading.Lock()
+        self.node_locks = {}
+
+    def register(self, node, ip, username):
+        with self.lock:
+            if self.addresses.get(node) != (ip, username):
+                self.addresses[node] = (ip, username)
+                self._drop(node)
+
+    def _node_lock(self, node):
+        with self.lock:
+            if self.pkey is None:
+                self.pkey = load_key(self.key_filename)
+            return self.node_locks.setdefault(node, threading.Lock())
+
+    def _drop(self, node):
+        ssh = self.sessions.pop(node, None)
+        if ssh is not None:
+            ssh.close()
+
+    def get(self, node):
+        """The open session of a registered node"""
+        with self._node_lock(node):
+            ssh = self.sessions.get(node)
+            if ssh is not None:
+                transport = ssh.get_transport()
+                if transport is not None and transport.is_active():
+                    return ssh
+                self._drop(node)
+            ip, username = self.addresses[node]
+            with tracing.span('ssh-connect', node):
+                ssh = connect(ip, username, timeout=self.timeout, pkey=self.pkey)
+            ssh.get_transport().set_keepalive(self.keepalive)
+            self.sessions[node] = ssh
+            self.connects += 1
+            return ssh
+
+    def wait(self, node, timeout=None, interval=5):
+        """Wait until a node that is still booting accepts ssh connections"""
+        deadline = time.time() + (timeout or ssh_wait_timeout)
+        while True:
+            try:
+                return self.get(node)
+            except (paramiko.SSHException, socket.error, EOFError):
+                if time.time() + interval > deadline:
+                    raise
+                time.sleep(interval)
+
+    def run(self, node, command, check=True, timeout=None):
+        """Run command on node, reconnecting once if the session broke before
+        the command was sent; a command that was sent is never run twice"""
+        with tracing.span('ssh-command', node, command=command[:200]):
+            try:
+                return run(self.get(node), command, node, check, timeout)
+            except NotSent:
+                with self._node_lock(node):
+                    self._drop(node)
+                return run(self.get(node), command, node, check, timeout)
+
+    def close(self):
+        with self.lock:
+            for node in self.sessions.keys():
+                self._drop(node)
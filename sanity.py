@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+sanity.py
+===============
+Post-boot sanity checks of a VM: its readiness probes (see readiness.py), a
+ping from here to its fixed ip, an ssh login and a ping from the VM to the
+internet.
+
+run_checks() runs all of them on one node and keeps the outcome and the time
+of each check; the scripts run it for many nodes at once and print_summary()
+shows which nodes passed which check in a single table.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import subprocess
+import time
+
+from prettytable import PrettyTable
+
+import readiness
+import tracing
+
+try:
+    from config import sanity_workers
+except ImportError:
+    sanity_workers = None
+
+
+class Check(object):
+    """Outcome of one sanity check on one node"""
+
+    def __init__(self, name):
+        self.name = name
+        self.ok = False
+        self.detail = ''
+        self.elapsed = 0.0
+
+
+class Node(object):
+    """What the checks need to know about the node they check"""
+
+    def __init__(self, name, server, fixed_ip, sessions):
+        self.name = name
+        self.server = server
+        self.fixed_ip = fixed_ip
+        self.sessions = sessions
+
+
+def check_ready(node):
+    """The node passes its readiness probes, see readiness.py"""
+    return ", ".join(str(result) for result in readiness.wait_ready(node))
+
+
+def check_ping(node):
+    """The fixed ip answers a ping from here"""
+    try:
+        subprocess.check_output(['ping', '-c', '3', node.fixed_ip])
+    except subprocess.CalledProcessError:
+        raise Exception("ping to fixedip %s failed" % node.fixed_ip)
+    return ""
+
+
+def check_ssh(node):
+    return node.sessions.run(node.name, "uptime").stdout.strip()
+
+
+def check_internet(node):
+    result = node.sessions.run(node.name, "ping -c2 www.google.ca", check=False)
+    if result.exit_status != 0:
+        raise Exception("no internet access")
+    return ""
+
+
+# name and function of every check, in the order they run
+CHECKS = [
+    ("ready", check_ready),
+    ("ping", check_ping),
+    ("ssh", check_ssh),
+    ("internet", check_internet),
+]
+
+
+def run_checks(node, checks=None):
+    """Run the checks on a Node, returns the Checks"""
+    results = []
+    for name, func in checks or CHECKS:
+        check = Check(name)
+        start = time.time()
+        try:
+            check.detail = func(node) or ''
+            check.ok = True
+        except Exception, e:
+            check.detail = str(e)
+        check.elapsed = time.time() - start
+        tracing.add('check-%s' % name, start, start + check.elapsed, node.name, ok=check.ok)
+        results.append(check)
+    return results
+
+
+def print_summary(results, title=None):
+    """Print which node passed which check, from run_parallel results of run_checks"""
+    names = [name for name, func in CHECKS]
+    for result in results:
+        if result.ok:
+            names = [check.name for check in result.value]
+            break
+    x = PrettyTable(["Node"] + names + ["Time (s)"])
+    passed = 0
+    for result in results:
+        if not result.ok:
+            x.add_row([result.node] + ["ERROR"] * len(names) + ["%.1f" % result.elapsed])
+            continue
+        row = [result.node]
+        for check in result.value:
+            row.append("%s %.1fs" % (check.ok and "OK" or "FAILED", check.elapsed))
+        x.add_row(row + ["%.1f" % result.elapsed])
+        if all(check.ok for check in result.value):
+            passed += 1
+    if title:
+        print "\n%s" % title
+    print x
+    for result in results:
+        if not result.ok:
+            print "%s: %s" % (result.node, result.error)
+            continue
+        for check in result.value:
+            if not check.ok:
+                print "%s %s: %s" % (result.node, check.name, check.detail)
+    print "%d/%d nodes passed every check\n" % (passed, len(results))
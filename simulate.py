@@ -0,0 +1,679 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+simulate.py
+===============
+An in-process stand-in for the SAVI testbed, to run the scripts without a
+cloud (see benchmark.py). FakeCloud plays:
+
+    Nova        servers (create, list, get, delete, console log), images,
+                flavors, security groups and their rules
+    Quantum     networks and the ports of the servers
+    ssh         a session to every booted VM, with a small model of
+                ovs-vsctl (bridges, ports, interfaces, controllers) and
+                canned output for the other commands
+    ping        from this machine to the VMs
+
+Every API call and remote command is counted in 'calls', and the remote
+commands are kept in 'commands'. 'latency' and 'ssh_latency' add a delay
+to every call, 'boot_time' is how long a VM takes to become ACTIVE,
+'error_rate' is the share of VMs that end up in ERROR and 'drop_rate' the
+share of remote commands on which the ssh connection breaks.
+
+install() replaces cloud.ClientFactory, remote.connect and the ping of
+sanity.py with the fakes; uninstall() puts the real ones back.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import json
+import random
+import re
+import socket
+import subprocess
+import threading
+import time
+
+from novaclient import exceptions
+
+import cloud
+import remote
+import sanity
+
+
+class FakeResource(object):
+    """An API object with the attributes of its _info dictionary"""
+
+    def __init__(self, manager, info):
+        self.manager = manager
+        self._info = {}
+        self._add_details(info)
+
+    def _add_details(self, info):
+        for key, value in info.items():
+            setattr(self, key, value)
+            self._info[key] = value
+
+
+class FakeManager(object):
+    """Lookup of the resources of one kind; find(name=...) makes missing ones on demand"""
+
+    def __init__(self, cloud, kind, region, autocreate=False, defaults=None):
+        self.cloud = cloud
+        self.kind = kind
+        self.region = region
+        self.autocreate = autocreate
+        self.defaults = defaults or {}
+        self.items = {}
+
+    def _call(self, method):
+        self.cloud.api_call("nova.%s.%s" % (self.kind, method))
+
+    def list(self, *args, **kwargs):
+        self._call("list")
+        return self.items.values()
+
+    def get(self, item_id):
+        self._call("get")
+        item = self.items.get(str(item_id))
+        if item is None:
+            raise exceptions.NotFound(404, "%s %s not found" % (self.kind, item_id))
+        return item
+
+    def find(self, **kwargs):
+        self._call("find")
+        for item in self.items.values():
+            if all(getattr(item, key, None) == value for key, value in kwargs.items()):
+                return item
+        if self.autocreate and kwargs.keys() == ['name']:
+            return self.add(kwargs['name'])
+        raise exceptions.NotFound(404, "no %s with %s" % (self.kind, kwargs))
+
+    def add(self, name):
+        with self.cloud.lock:
+            for item in self.items.values():
+                if item.name == name:
+                    return item
+            info = {'id': self.cloud.new_id(self.kind), 'name': name}
+            for key, value in self.defaults.items():
+                info[key] = type(value)(value)
+            item = FakeResource(self, info)
+            self.items[item.id] = item
+            return item
+
+
+class FakeRuleManager(object):
+
+    def __init__(self, cloud, groups):
+        self.cloud = cloud
+        self.groups = groups
+
+    def create(self, parent_group_id, ip_protocol=None, from_port=None, to_port=None, cidr=None, group_id=None):
+        self.cloud.api_call("nova.security_group_rules.create")
+        group = self.groups.get(parent_group_id)
+        rule = {'ip_protocol': ip_protocol, 'from_port': from_port, 'to_port': to_port,
+                'ip_range': {'cidr': cidr}}
+        for existing in group.rules:
+            if existing == rule:
+                raise exceptions.BadRequest(400, "rule already exists")
+        group.rules.append(rule)
+        return FakeResource(self, dict(rule, id=self.cloud.new_id('rule')))
+
+
+class FakeServer(FakeResource):
+
+    @property
+    def networks(self):
+        # a new dictionary on every access, as novaclient does
+        networks = {}
+        for network, addresses in self.addresses.items():
+            networks[network] = [a['addr'] for a in addresses]
+        return networks
+
+    def get(self):
+        self._add_details(self.manager.get(self.id)._info)
+
+    def delete(self):
+        self.manager.delete(self.id)
+
+    def get_console_output(self, length=None):
+        return self.manager.get_console_output(self.id, length)
+
+
+class FakeServerManager(object):
+    """The servers of one region, read from the shared state of the FakeCloud"""
+
+    def __init__(self, cloud, region):
+        self.cloud = cloud
+        self.region = region
+
+    def _server(self, vm):
+        return FakeServer(self, self.cloud.server_info(vm))
+
+    def create(self, name, image, flavor, key_name=None, security_groups=None,
+               scheduler_hints=None, nics=None, **kwargs):
+        self.cloud.api_call("nova.servers.create")
+        vm = self.cloud.boot(self.region, name, scheduler_hints or {})
+        return self._server(vm)
+
+    def list(self, detailed=True, search_opts=None):
+        self.cloud.api_call("nova.servers.list")
+        pattern = (search_opts or {}).get('name')
+        servers = []
+        for vm in self.cloud.vms_of(self.region):
+            if pattern and not re.search(pattern, vm['name']):
+                continue
+            servers.append(self._server(vm))
+        return servers
+
+    def get(self, server_id):
+        self.cloud.api_call("nova.servers.get")
+        vm = self.cloud.vm(server_id)
+        if vm is None:
+            raise exceptions.NotFound(404, "server %s not found" % server_id)
+        return self._server(vm)
+
+    def delete(self, server_id):
+        self.cloud.api_call("nova.servers.delete")
+        if not self.cloud.delete(server_id):
+            raise exceptions.NotFound(404, "server %s not found" % server_id)
+
+    def get_console_output(self, server_id, length=None):
+        self.cloud.api_call("nova.servers.get_console_output")
+        lines = self.cloud.console(server_id)
+        if length is not None:
+            lines = lines[-int(length):]
+        return "\n".join(lines) + "\n"
+
+
+class FakeNova(object):
+
+    def __init__(self, cloud, region):
+        self.servers = FakeServerManager(cloud, region)
+        self.images = cloud.region_manager(region, 'images', autocreate=True)
+        self.flavors = cloud.region_manager(region, 'flavors', autocreate=True)
+        self.security_groups = cloud.security_groups(region)
+        self.security_group_rules = FakeRuleManager(cloud, self.security_groups.items)
+
+
+class FakeQuantum(object):
+
+    EXTED_PLURALS = {}
+
+    def __init__(self, cloud, region):
+        self.cloud = cloud
+        self.region = region
+
+    def _match(self, items, filters):
+        matched = []
+        for item in items:
+            ok = True
+            for key, value in filters.items():
+                if key == 'fields':
+                    continue
+                values = value if isinstance(value, list) else [value]
+                if item.get(key) not in values:
+                    ok = False
+            if ok:
+                matched.append(item)
+        return matched
+
+    def list_networks(self, **filters):
+        self.cloud.api_call("quantum.list_networks")
+        return {'networks': self._match(self.cloud.networks, filters)}
+
+    def list_ports(self, **filters):
+        self.cloud.api_call("quantum.list_ports")
+        return {'ports': self._match(self.cloud.ports_of(self.region), filters)}
+
+
+class FakeClientFactory(object):
+    """What cloud.ClientFactory hands out, for a FakeCloud"""
+
+    def __init__(self, cloud):
+        self.cloud = cloud
+        self.authentications = 0
+
+    def get_token(self):
+        if not self.authentications:
+            self.cloud.api_call("keystone.authenticate")
+            self.authentications += 1
+        return cloud.Token('fake-token', None)
+
+    def nova(self, region):
+        self.get_token()
+        return FakeNova(self.cloud, region)
+
+    def quantum(self, region):
+        self.get_token()
+        return FakeQuantum(self.cloud, region)
+
+
+class FakeOVS(object):
+    """The bridges, ports and controllers of one VM, changed by ovs-vsctl commands"""
+
+    def __init__(self, mac_prefix):
+        self.bridges = {}
+        self.interfaces = {}
+        # interface -> ip/prefix, as set by ifconfig
+        self.addresses = {}
+        self.mac_prefix = mac_prefix
+        self.next_ofport = {}
+
+    def _mac(self, n):
+        return "%s:%02x" % (self.mac_prefix, n % 256)
+
+    def add_bridge(self, bridge):
+        if bridge in self.bridges:
+            return
+        self.bridges[bridge] = {'ports': [], 'controller': [], 'fail_mode': None,
+                                'connection_mode': None,
+                                'dpid': "%016x" % (len(self.bridges) + 1)}
+        self.next_ofport[bridge] = 1
+        self.interfaces[bridge] = {'bridge': bridge, 'type': 'internal', 'options': {},
+                                   'mac': self._mac(len(self.interfaces)), 'ofport': 65534}
+        self.bridges[bridge]['ports'].append(bridge)
+
+    def add_port(self, bridge, port):
+        if port in self.interfaces:
+            return
+        if bridge not in self.bridges:
+            raise ValueError("no bridge named %s" % bridge)
+        self.interfaces[port] = {'bridge': bridge, 'type': '', 'options': {},
+                                 'mac': None, 'ofport': self.next_ofport[bridge]}
+        self.next_ofport[bridge] += 1
+        self.bridges[bridge]['ports'].append(port)
+
+    def del_port(self, port, must_exist=True):
+        iface = self.interfaces.pop(port, None)
+        self.addresses.pop(port, None)
+        if iface is None:
+            if must_exist:
+                raise ValueError("no port named %s" % port)
+            return
+        self.bridges[iface['bridge']]['ports'].remove(port)
+
+    def set_interface(self, port, settings):
+        iface = self.interfaces.get(port)
+        if iface is None:
+            raise ValueError("no row %s in table Interface" % port)
+        for setting in settings:
+            key, value = setting.split('=', 1)
+            if key == 'type':
+                iface['type'] = value
+                if value == 'internal' and iface['mac'] is None:
+                    iface['mac'] = self._mac(len(self.interfaces))
+            elif key.startswith('options:'):
+                iface['options'][key[len('options:'):]] = value
+            elif key == 'mac':
+                # only ever set to the mac_in_use read just before
+                iface['mac_set'] = iface['mac']
+
+    def get(self, table, record, column):
+        if table == 'bridge':
+            return json.dumps(self.bridges[record]['dpid'])
+        value = self.interfaces[record][{'mac_in_use': 'mac'}.get(column, column)]
+        if isinstance(value, basestring):
+            return json.dumps(value)
+        return str(value)
+
+    def apply(self, op):
+        """One ovs-vsctl command, returns its output"""
+        words = op.split()
+        must_exist = True
+        while words and words[0].startswith('--'):
+            must_exist = must_exist and words[0] != '--if-exists'
+            words = words[1:]
+        cmd, args = words[0], words[1:]
+        if cmd == 'add-br':
+            self.add_bridge(args[0])
+        elif cmd == 'add-port':
+            self.add_port(args[0], args[1])
+        elif cmd == 'del-port':
+            self.del_port(args[-1], must_exist)
+        elif cmd == 'set' and args[0] == 'interface':
+            self.set_interface(args[1], args[2:])
+        elif cmd == 'set' and args[0] == 'controller':
+            self.bridges[args[1]]['connection_mode'] = args[2].split('=', 1)[1]
+        elif cmd == 'set-controller':
+            self.bridges[args[0]]['controller'] = args[1:]
+        elif cmd == 'del-controller':
+            self.bridges[args[0]]['controller'] = []
+            self.bridges[args[0]]['connection_mode'] = None
+        elif cmd == 'set-fail-mode':
+            self.bridges[args[0]]['fail_mode'] = args[1]
+        elif cmd == 'del-fail-mode':
+            self.bridges[args[0]]['fail_mode'] = None
+        elif cmd == 'get':
+            return self.get(args[0], args[1], args[2])
+        else:
+            raise ValueError("unknown ovs-vsctl command %s" % cmd)
+        return ''
+
+    def _rows(self, table):
+        def value(v):
+            # an empty optional column is an empty set
+            if v is None:
+                return ["set", []]
+            return v
+
+        def uuids(prefix, names):
+            if len(names) == 1:
+                return ["uuid", prefix + names[0]]
+            return ["set", [["uuid", prefix + name] for name in names]]
+        rows = []
+        if table == 'Bridge':
+            for name, br in sorted(self.bridges.items()):
+                rows.append({'name': name, 'ports': uuids('port-', br['ports']),
+                             'controller': uuids('ctl-', br['controller'] and [name] or []),
+                             'fail_mode': value(br['fail_mode']), 'datapath_id': br['dpid']})
+        elif table == 'Port':
+            for name in sorted(self.interfaces):
+                rows.append({'_uuid': ["uuid", 'port-' + name], 'name': name,
+                             'interfaces': ["uuid", 'iface-' + name]})
+        elif table == 'Interface':
+            for name, iface in sorted(self.interfaces.items()):
+                rows.append({'_uuid': ["uuid", 'iface-' + name], 'name': name, 'type': iface['type'],
+                             'options': ["map", sorted(iface['options'].items())],
+                             'mac': value(iface.get('mac_set')), 'mac_in_use': value(iface['mac']),
+                             'ofport': iface['ofport']})
+        elif table == 'Controller':
+            for name, br in sorted(self.bridges.items()):
+                for target in br['controller']:
+                    rows.append({'_uuid': ["uuid", 'ctl-' + name], 'target': target,
+                                 'connection_mode': value(br['connection_mode'])})
+        return rows
+
+    def list_tables(self, command):
+        """The output of 'ovs-vsctl --format=json -- --columns=... list Table -- ...'"""
+        output = []
+        for part in command.split(' -- ')[1:]:
+            words = part.split()
+            columns = words[0][len('--columns='):].split(',')
+            rows = self._rows(words[-1])
+            output.append(json.dumps({'headings': columns,
+                                      'data': [[row[c] for c in columns] for row in rows]}))
+        return "\n".join(output) + "\n"
+
+
+class FakeChannel(object):
+
+    def __init__(self, status):
+        self.status = status
+
+    def recv_exit_status(self):
+        return self.status
+
+
+class FakeStream(object):
+
+    def __init__(self, data='', status=0):
+        self.data = data
+        self.channel = FakeChannel(status)
+
+    def read(self):
+        return self.data
+
+    def close(self):
+        pass
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def set_keepalive(self, interval):
+        pass
+
+
+class FakeSSH(object):
+    """An ssh session to one VM, what remote.connect returns"""
+
+    def __init__(self, cloud, vm):
+        self.cloud = cloud
+        self.vm = vm
+        self.transport = FakeTransport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.transport.active = False
+
+    def exec_command(self, command, timeout=None):
+        if not self.transport.active:
+            raise EOFError("session closed")
+        stdout, stderr, status = self.cloud.execute(self.vm, command)
+        return FakeStream(), FakeStream(stdout, status), FakeStream(stderr)
+
+
+class FakeCloud(object):
+    """Nova, Quantum and the VMs of every region, see the module description"""
+
+    def __init__(self, latency=0.0, ssh_latency=0.0, boot_time=0.0, error_rate=0.0,
+                 drop_rate=0.0, hosts_per_region=8, networks=None, groups=None, seed=None):
+        self.latency = latency
+        self.ssh_latency = ssh_latency
+        self.boot_time = boot_time
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.hosts_per_region = hosts_per_region
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.calls = {}
+        self.commands = []
+        self.vms = {}
+        self.by_ip = {}
+        self.managers = {}
+        self.ids = 0
+        # quantum networks, found by name by the scripts
+        self.networks = [{'id': 'net-%s' % name, 'name': name} for name in networks or []]
+        self.groups = groups or []
+        self.saved = None
+
+    def api_call(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def new_id(self, kind):
+        with self.lock:
+            self.ids += 1
+            return "%s-%08d" % (kind, self.ids)
+
+    def region_manager(self, region, kind, autocreate=False, defaults=None):
+        with self.lock:
+            key = (region, kind)
+            if key not in self.managers:
+                self.managers[key] = FakeManager(self, kind, region, autocreate, defaults)
+            return self.managers[key]
+
+    def security_groups(self, region):
+        """The security groups of a region, 'groups' and any group asked for by name"""
+        manager = self.region_manager(region, 'security_groups', autocreate=True, defaults={'rules': []})
+        for name in self.groups:
+            manager.add(name)
+        return manager
+
+    # ---- servers
+
+    def boot(self, region, name, hints):
+        with self.lock:
+            n = len(self.vms) + 1
+            vm_id = self.new_id('vm')
+            ip = "10.%d.%d.%d" % (1 + n // 65536 % 250, n // 256 % 256, n % 256)
+            host = hints.get('force_hosts') or "%s-cmp%02d" % (region.lower(), self.random.randrange(self.hosts_per_region))
+            vm = {'id': vm_id, 'name': name, 'region': region, 'ip': ip, 'host': host,
+                  'created': time.time(), 'failed': self.random.random() < self.error_rate,
+                  'deleted': False, 'instance_name': "instance-%08x" % n,
+                  'ovs': FakeOVS("fa:16:3e:%02x:%02x" % (n // 256 % 256, n % 256))}
+            self.vms[vm_id] = vm
+            self.by_ip[ip] = vm
+            return vm
+
+    def status(self, vm):
+        if vm['deleted']:
+            return "DELETED"
+        if time.time() - vm['created'] < self.boot_time:
+            return "BUILD"
+        if vm['failed']:
+            return "ERROR"
+        return "ACTIVE"
+
+    def server_info(self, vm):
+        info = {'id': vm['id'], 'name': vm['name'], 'status': self.status(vm),
+                'addresses': {'tenant-net': [{'addr': vm['ip'], 'version': 4}]},
+                'OS-EXT-SRV-ATTR:host': vm['host'],
+                'OS-EXT-SRV-ATTR:instance_name': vm['instance_name']}
+        if info['status'] == "ERROR":
+            info['fault'] = {'code': 500, 'message': 'No valid host was found.'}
+        return info
+
+    def vm(self, vm_id):
+        vm = self.vms.get(vm_id)
+        if vm is None or vm['deleted']:
+            return None
+        return vm
+
+    def vms_of(self, region):
+        with self.lock:
+            return [vm for vm in self.vms.values() if vm['region'] == region and not vm['deleted']]
+
+    def delete(self, vm_id):
+        with self.lock:
+            vm = self.vm(vm_id)
+            if vm is None:
+                return False
+            vm['deleted'] = True
+            return True
+
+    def console(self, vm_id):
+        vm = self.vms[vm_id]
+        lines = ["[    0.000000] Initializing cgroup subsys cpuset",
+                 "cloud-init start-local running"]
+        if self.status(vm) == "ACTIVE":
+            lines += ["ci-info: eth0 : 1 %s 255.0.0.0" % vm['ip'],
+                      "Generating public/private rsa key pair.",
+                      "Generation complete.",
+                      "cloud-init boot finished"]
+        return lines
+
+    def ports_of(self, region):
+        ports = []
+        for vm in self.vms_of(region):
+            ports.append({'id': 'port-%s' % vm['id'], 'device_id': vm['id'],
+                          'fixed_ips': [{'ip_address': vm['ip']}]})
+        return ports
+
+    # ---- ssh
+
+    def connect(self, ip, username, key_filename=None, timeout=None, pkey=None):
+        """remote.connect() for the VMs of this cloud"""
+        self.api_call("ssh.connect")
+        vm = self.by_ip.get(ip)
+        if vm is None or self.status(vm) != "ACTIVE":
+            raise socket.error(111, "Connection refused")
+        return FakeSSH(self, vm)
+
+    def execute(self, vm, command):
+        """stdout, stderr and exit status of a command run on a VM"""
+        with self.lock:
+            self.calls['ssh.command'] = self.calls.get('ssh.command', 0) + 1
+            self.commands.append((vm['name'], command))
+            drop = self.random.random() < self.drop_rate
+        if self.ssh_latency:
+            time.sleep(self.ssh_latency)
+        if drop:
+            raise socket.error(104, "Connection reset by peer")
+        output = []
+        with self.lock:
+            for part in command.split(' && '):
+                try:
+                    output.append(self._execute_one(vm, part.strip()))
+                except (ValueError, KeyError, IndexError), e:
+                    return "\n".join(output), "ovs-vsctl: %s\n" % e, 1
+        return "\n".join(output), '', 0
+
+    def _execute_one(self, vm, command):
+        ovs = vm['ovs']
+        if command.startswith("sudo ovs-vsctl --format=json"):
+            self.calls['ovs.read'] = self.calls.get('ovs.read', 0) + 1
+            return ovs.list_tables(command)
+        if command.startswith("sudo ovs-vsctl"):
+            ops = command.split(' -- ')[1:] or [command[len("sudo ovs-vsctl"):].strip()]
+            self.calls['ovs.transaction'] = self.calls.get('ovs.transaction', 0) + 1
+            # a transaction is all or nothing
+            backup = json.dumps([ovs.bridges, ovs.interfaces, ovs.next_ofport])
+            try:
+                return "\n".join(ovs.apply(op) for op in ops)
+            except (ValueError, KeyError, IndexError):
+                ovs.bridges, ovs.interfaces, ovs.next_ofport = json.loads(backup)
+                raise
+        if command.startswith("sudo ifconfig"):
+            words = command.split()
+            ovs.addresses[words[2]] = words[3]
+            return ''
+        if command.startswith("ip -o -4 addr show"):
+            return "\n".join("%d: %s    inet %s scope global %s" % (n + 2, name, address, name)
+                             for n, (name, address) in enumerate(sorted(ovs.addresses.items())))
+        if command.startswith("uptime"):
+            return " 12:00:00 up 1 min,  0 users,  load average: 0.00, 0.00, 0.00"
+        # ping, ifconfig, test -f and the mac lookups of the setup
+        return ''
+
+    def vxlan_ports(self):
+        """The number of vxlan ports set up on all the VMs"""
+        count = 0
+        for vm in self.vms.values():
+            for iface in vm['ovs'].interfaces.values():
+                if iface['type'] == 'vxlan':
+                    count += 1
+        return count
+
+    # ---- ping from this machine
+
+    def check_output(self, args, **kwargs):
+        """subprocess.check_output for the ping of sanity.py"""
+        self.api_call("ping")
+        vm = self.by_ip.get(args[-1])
+        if vm is None or self.status(vm) != "ACTIVE":
+            raise subprocess.CalledProcessError(1, args)
+        return "3 packets transmitted, 3 received, 0% packet loss\n"
+
+    # ---- switching the scripts over to the fakes
+
+    def install(self):
+        fake_subprocess = type('FakeSubprocess', (object,), {
+            'check_output': staticmethod(self.check_output),
+            'CalledProcessError': subprocess.CalledProcessError})
+        self.saved = (cloud.ClientFactory, remote.connect, remote.load_key, sanity.subprocess)
+        cloud.ClientFactory = lambda *args, **kwargs: FakeClientFactory(self)
+        remote.connect = self.connect
+        remote.load_key = lambda key_filename: None
+        sanity.subprocess = fake_subprocess
+
+    def uninstall(self):
+        if self.saved is not None:
+            cloud.ClientFactory, remote.connect, remote.load_key, sanity.subprocess = self.saved
+            self.saved = None
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+topogen.py
+===============
+Generators of large topologies, to be used in topology.py instead of
+writing the 'topology' and 'nodes' dictionaries by hand:
+
+    linear          a chain of switches
+    tree            a tree of switches, the hosts on the leaves
+    fat-tree        the k-ary fat tree: core, aggregation and edge switches
+    leaf-spine      every leaf switch linked to every spine switch
+    torus           a grid of switches, wrapped around on both sides
+    random-regular  switches with the same number of random neighbours
+
+Every generator yields (switch, entries) one switch at a time, the entries
+written as in a hand-made topology: the name of a switch, or a (host,
+internal ip) tuple. Switches are named sw1, sw2, ..., hosts h1, h2, ... and
+the host ips are handed out in order from 'start', within its network of
+'prefix_len' bits (see Hosts). The bridges are named as for a hand-made
+topology (see graph.py and setupSwitch).
+
+build() turns a generator into the two dictionaries, e.g. in topology.py:
+
+    from topogen import build, fat_tree
+    topology, nodes = build(fat_tree(4), switch={'contr_addr': contr_addr},
+                            host={'flavor': 'm1.tiny'})
+
+Most of these topologies have loops, which need a controller that handles
+them (not a simple learning switch).
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import random
+import socket
+import struct
+
+from ovs import int_prefix_len
+
+# the first internal ip given to a host, as in topology.py.sample
+HOST_START = '192.168.200.10'
+
+
+def _switch(i):
+    return 'sw%d' % (i + 1)
+
+
+class Hosts(object):
+    """Names and internal ips of the hosts, in the order they are attached.
+
+    The ips count up from 'start' within its network of prefix_len bits
+    (int_prefix_len in config.py, the prefix the internal ports are set up
+    with), leaving out the addresses ending in .0 and .255. Running out of
+    the network raises a ValueError: hosts of two networks would only reach
+    each other through the controller. Large topologies need a shorter
+    prefix, e.g. int_prefix_len = 16.
+    """
+
+    def __init__(self, start=None, prefix_len=None):
+        self.count = 0
+        self.prefix_len = prefix_len or int_prefix_len
+        self.addr = struct.unpack('!I', socket.inet_aton(start or HOST_START))[0]
+        mask = (0xffffffff << (32 - self.prefix_len)) & 0xffffffff
+        self.network = self.addr & mask
+        self.broadcast = self.network | (~mask & 0xffffffff)
+
+    def next(self):
+        while self.addr & 0xff in (0, 255) or self.addr == self.network:
+            self.addr += 1
+        if self.addr >= self.broadcast:
+            raise ValueError("out of host ips in %s/%d after %d hosts, set a shorter int_prefix_len in config.py"
+                             % (socket.inet_ntoa(struct.pack('!I', self.network)), self.prefix_len, self.count))
+        ip = socket.inet_ntoa(struct.pack('!I', self.addr))
+        self.addr += 1
+        self.count += 1
+        return ('h%d' % self.count, ip)
+
+    def take(self, n):
+        return [self.next() for i in range(n)]
+
+
+def linear(n, hosts=1, start=None, prefix_len=None):
+    """n switches in a chain, each with 'hosts' hosts"""
+    ips = Hosts(start, prefix_len)
+    for i in range(n):
+        entries = []
+        if i > 0:
+            entries.append(_switch(i - 1))
+        yield _switch(i), entries + ips.take(hosts)
+
+
+def tree(depth, fanout, hosts=None, start=None, prefix_len=None):
+    """A tree of 'depth' levels of switches, every switch with 'fanout' children.
+
+    Each switch of the last level has 'hosts' hosts (fanout by default).
+    """
+    if depth < 1 or fanout < 1:
+        raise ValueError("a tree needs a depth and fanout of at least 1")
+    if hosts is None:
+        hosts = fanout
+    ips = Hosts(start, prefix_len)
+    total = sum(fanout ** level for level in range(depth))
+    leaves = fanout ** (depth - 1)
+    for i in range(total):
+        entries = []
+        if i > 0:
+            # the children of switch i are i * fanout + 1 ... i * fanout + fanout
+            entries.append(_switch((i - 1) // fanout))
+        if i >= total - leaves:
+            entries += ips.take(hosts)
+        yield _switch(i), entries
+
+
+def fat_tree(k, start=None, prefix_len=None):
+    """The k-ary fat tree: (k/2)^2 core switches and k pods of k/2
+    aggregation and k/2 edge switches, each edge switch with k/2 hosts.
+    """
+    if k < 2 or k % 2:
+        raise ValueError("a fat tree needs an even k, not %s" % k)
+    half = k // 2
+    ips = Hosts(start, prefix_len)
+    cores = half * half
+    for i in range(cores):
+        yield _switch(i), []
+    for pod in range(k):
+        # aggregation switches of the pod, then its edge switches
+        agg = cores + pod * k
+        edge = agg + half
+        for j in range(half):
+            yield _switch(agg + j), [_switch(j * half + m) for m in range(half)]
+        for j in range(half):
+            yield _switch(edge + j), [_switch(agg + m) for m in range(half)] + ips.take(half)
+
+
+def leaf_spine(spines, leaves, hosts=1, start=None, prefix_len=None):
+    """'leaves' leaf switches, each linked to all 'spines' spine switches and with 'hosts' hosts"""
+    ips = Hosts(start, prefix_len)
+    for i in range(spines):
+        yield _switch(i), []
+    for i in range(leaves):
+        yield _switch(spines + i), [_switch(s) for s in range(spines)] + ips.take(hosts)
+
+
+def torus(rows, cols, hosts=1, start=None, prefix_len=None):
+    """A rows x cols grid of switches, each linked to the next one in its
+    row and column, the last ones wrapped around to the first
+    """
+    ips = Hosts(start, prefix_len)
+    for r in range(rows):
+        for c in range(cols):
+            entries = []
+            # a ring of two has a single link, of one none
+            if cols > 2 or (cols == 2 and c == 0):
+                entries.append(_switch(r * cols + (c + 1) % cols))
+            if rows > 2 or (rows == 2 and r == 0):
+                entries.append(_switch(((r + 1) % rows) * cols + c))
+            yield _switch(r * cols + c), entries + ips.take(hosts)
+
+
+def _regular_edges(n, degree, rng, tries=100):
+    stubs = []
+    for i in range(n):
+        stubs += [i] * degree
+    for attempt in range(tries):
+        edges = set()
+        left = list(stubs)
+        while left:
+            rng.shuffle(left)
+            retry = []
+            for a, b in zip(left[::2], left[1::2]):
+                edge = (min(a, b), max(a, b))
+                if a == b or edge in edges:
+                    retry += [a, b]
+                else:
+                    edges.add(edge)
+            if len(retry) == len(left):
+                # only loops and parallel links are left, start over
+                break
+            left = retry
+        if not left:
+            return edges
+    raise ValueError("no random %d-regular graph of %d switches found" % (degree, n))
+
+
+def random_regular(n, degree, hosts=1, seed=None, start=None, prefix_len=None):
+    """n switches, each linked to 'degree' others picked at random.
+
+    The same seed gives the same topology.
+    """
+    if degree >= n or (n * degree) % 2:
+        raise ValueError("no %d-regular graph of %d switches" % (degree, n))
+    edges = _regular_edges(n, degree, random.Random(seed))
+    neighbours = {}
+    for a, b in edges:
+        neighbours.setdefault(a, []).append(b)
+    ips = Hosts(start, prefix_len)
+    for i in range(n):
+        # every link is listed once, by the switch with the lower number
+        yield _switch(i), [_switch(j) for j in sorted(neighbours.get(i, []))] + ips.take(hosts)
+
+
+GENERATORS = {
+    'linear': linear,
+    'tree': tree,
+    'fat-tree': fat_tree,
+    'leaf-spine': leaf_spine,
+    'torus': torus,
+    'random-regular': random_regular,
+}
+
+
+def build(switches, switch=None, host=None):
+    """The 'topology' and 'nodes' dictionaries of a generator.
+
+    switch and host are the 'nodes' entries given to every switch and every
+    host (e.g. region, flavor, contr_addr); each node gets its own copy.
+    """
+    topology = {}
+    nodes = {}
+    for name, entries in switches:
+        topology[name] = entries
+        nodes[name] = dict(switch or {})
+        for entry in entries:
+            if isinstance(entry, tuple) and entry[0] not in nodes:
+                nodes[entry[0]] = dict(host or {})
+    return topology, nodes
+
+
+def generate(kind, switch=None, host=None, **params):
+    """build() of the generator named 'kind', e.g. generate('torus', rows=10, cols=10)"""
+    if kind not in GENERATORS:
+        raise ValueError("unknown topology %s, one of: %s" % (kind, ", ".join(sorted(GENERATORS))))
+    return build(GENERATORS[kind](**params), switch, host)
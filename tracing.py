@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2014 University of Toronto.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''
+tracing.py
+===============
+Timing of every phase of a run and of every step on every node: keystone
+authentication, VM creation, waiting for ACTIVE, the readiness probes and
+sanity checks, ssh connections and commands, the ovs-vsctl reads and
+transactions and the information queries.
+
+The steps are written to 'trace_file' (config.py) in the Chrome trace event
+format, with one row per node; open it in chrome://tracing or Perfetto.
+summary() prints the nodes and the steps that took the longest.
+
+The steps of a node are recorded under the node name of the topology (sw1,
+h1, ...); the modules that only know the VM name record under that, and
+alias() maps it to the node.
+
+'''
+
+# vim: tabstop=4 shiftwidth=4 softtabstop=4 expandtab
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from config import trace_file
+except ImportError:
+    trace_file = 'trace.json'
+
+# the row of the steps that belong to no node
+MAIN = 'main'
+
+
+class Span(object):
+    """One timed step"""
+
+    def __init__(self, name, node, start, end, args=None):
+        self.name = name
+        self.node = node
+        self.start = start
+        self.end = end
+        self.args = args or {}
+
+    @property
+    def elapsed(self):
+        return self.end - self.start
+
+
+class Tracer(object):
+    """The steps of this run, from all the threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every step, the run starts now"""
+        with self.lock:
+            self.origin = time.time()
+            self.spans = []
+            self.aliases = {}
+            self.current = None
+
+    def add(self, name, start, end, node=None, **args):
+        with self.lock:
+            self.spans.append(Span(name, node or MAIN, start, end, args))
+
+    @contextmanager
+    def span(self, name, node=None, **args):
+        """Time the body of a with statement"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.time(), node, **args)
+
+    def phase(self, name):
+        """End the running phase of the main thread and start the next, None ends it"""
+        now = time.time()
+        if self.current is not None:
+            self.add(self.current[0], self.current[1], now, None, phase=True)
+        self.current = None
+        if name is not None:
+            self.current = (name, now)
+
+    def alias(self, name, node):
+        """Record the steps of VM 'name' under 'node'"""
+        with self.lock:
+            self.aliases[name] = node
+
+    def _node(self, span):
+        return self.aliases.get(span.node, span.node)
+
+    def events(self):
+        """The steps as Chrome trace events, a row (tid) per node"""
+        with self.lock:
+            spans = list(self.spans)
+        rows = {MAIN: 0}
+        events = []
+        for span in sorted(spans, key=lambda s: s.start):
+            node = self._node(span)
+            if node not in rows:
+                rows[node] = len(rows)
+            events.append({'name': span.name, 'cat': node == MAIN and 'phase' or 'node',
+                           'ph': 'X', 'pid': 1, 'tid': rows[node],
+                           'ts': int((span.start - self.origin) * 1e6),
+                           'dur': int(span.elapsed * 1e6), 'args': span.args})
+        for node, tid in rows.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid,
+                           'args': {'name': node}})
+        return events
+
+    def save(self, path=None):
+        path = path or trace_file
+        if not path:
+            return None
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f)
+        os.rename(tmp, path)
+        return path
+
+    def summary(self, top=10):
+        """Print the slowest steps by name, the phases and the slowest nodes"""
+        from prettytable import PrettyTable
+        with self.lock:
+            spans = list(self.spans)
+        steps = {}
+        nodes = {}
+        for span in spans:
+            node = self._node(span)
+            if node == MAIN:
+                continue
+            total, longest, count, worst = steps.get(span.name, (0.0, 0.0, 0, None))
+            if span.elapsed >= longest:
+                longest, worst = span.elapsed, node
+            steps[span.name] = (total + span.elapsed, longest, count + 1, worst)
+            first, last = nodes.get(node, (span.start, span.end))
+            nodes[node] = (min(first, span.start), max(last, span.end))
+        phases = [span for span in spans if span.args.get('phase')]
+        if phases:
+            x = PrettyTable(["Phase", "Time (s)"])
+            for span in phases:
+                x.add_row([span.name, "%.1f" % span.elapsed])
+            print x
+        if steps:
+            x = PrettyTable(["Step", "Count", "Total (s)", "Slowest (s)", "Slowest node"])
+            for name, (total, longest, count, worst) in sorted(steps.items(), key=lambda i: -i[1][1])[:top]:
+                x.add_row([name, count, "%.1f" % total, "%.1f" % longest, worst])
+            print x
+        if nodes:
+            x = PrettyTable(["Node", "First step (s)", "Last step (s)", "Busy for (s)"])
+            for node, (first, last) in sorted(nodes.items(), key=lambda i: i[1][0] - i[1][1])[:top]:
+                x.add_row([node, "%.1f" % (first - self.origin), "%.1f" % (last - self.origin), "%.1f" % (last - first)])
+            print x
+
+
+tracer = Tracer()
+span = tracer.span
+add = tracer.add
+phase = tracer.phase
+alias = tracer.alias
+
+
+def finish(title=None):
+    """End the running phase, write the trace file and print the summary"""
+    phase(None)
+    path = tracer.save()
+    if title:
+        print "\n%s" % title
+    tracer.summary()
+    if path:
+        print "trace written to %s\n" % path